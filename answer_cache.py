@@ -0,0 +1,120 @@
+#answer_cache.py
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.logger import logger
+from app.core.metrics import counter, gauge
+from app.core.models import BaseResponseDTO, Options
+from app.core.utils.cache_helpers import TTLLRUCache
+from app.core.utils.embedding_cache import normalize_text
+
+# Bump whenever the prompts in app.core.utils.llm.prompts change meaningfully
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "1")
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Near-duplicate matching on question embeddings; disabled unless a threshold is set
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0")) or None
+
+exact_hits = counter("answer_cache_exact_hits_total")
+near_hits = counter("answer_cache_near_duplicate_hits_total")
+misses = counter("answer_cache_misses_total")
+evictions = counter("answer_cache_evictions_total")
+invalidations = counter("answer_cache_invalidations_total")
+cache_size = gauge("answer_cache_entries")
+
+answer_cache = TTLLRUCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS, on_evict=evictions.inc)
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def context_hash(rel_responses: List[str], unique_payloads: Iterable[Dict[str, Any]]) -> str:
+    """Hash of the retrieved context the answer is generated from"""
+    doc_ids = sorted(str(pl["doc_id"]) for pl in unique_payloads)
+    return _hash({"responses": rel_responses, "doc_ids": doc_ids})
+
+def _context_key(ctx_hash: str, options: Options, rf_type: Any, n: int, variant: str) -> str:
+    return _hash({
+        "context": ctx_hash,
+        "variant": variant,
+        "length": options.length,
+        "tone": options.tone,
+        "rf_type": getattr(rf_type, "value", rf_type),
+        "n": n,
+        "prompt_version": PROMPT_VERSION,
+    })
+
+def _unit(vector: List[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(arr)
+    return arr / norm if norm else arr
+
+def _find_near_duplicate(context_key: str, em_query: List[float]) -> Optional[List[BaseResponseDTO]]:
+    query = _unit(em_query)
+    best_score, best_answers = -1.0, None
+    for _, entry in answer_cache.items():
+        if entry["context_key"] != context_key or entry["embedding"] is None:
+            continue
+        score = float(np.dot(query, entry["embedding"]))
+        if score > best_score:
+            best_score, best_answers = score, entry["answers"]
+    if best_answers is not None and best_score >= ANSWER_CACHE_SIMILARITY_THRESHOLD:
+        logger.info(f"Answer cache near-duplicate hit (similarity {best_score:.3f})")
+        return best_answers
+    return None
+
+async def get_or_generate_answers(
+    question: str,
+    rel_responses: List[str],
+    unique_payloads: Iterable[Dict[str, Any]],
+    options: Options,
+    rf_type: Any,
+    n: int,
+    generate: Callable[[], Awaitable[List[BaseResponseDTO]]],
+    em_query: Optional[List[float]] = None,
+    variant: str = "chat"
+) -> List[BaseResponseDTO]:
+    """
+    Return cached answers for the question and retrieved context, or call generate and cache its result.
+    variant separates prompt flavours built from the same inputs (e.g. chat vs. file answers).
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return await generate()
+
+    context_key = _context_key(context_hash(rel_responses, unique_payloads), options, rf_type, n, variant)
+    key = _hash({"question": normalize_text(question), "context_key": context_key})
+
+    entry = answer_cache.get(key)
+    if entry is not None:
+        exact_hits.inc()
+        return [answer.model_copy(deep=True) for answer in entry["answers"]]
+
+    if ANSWER_CACHE_SIMILARITY_THRESHOLD and em_query is not None:
+        answers = _find_near_duplicate(context_key, em_query)
+        if answers is not None:
+            near_hits.inc()
+            return [answer.model_copy(deep=True) for answer in answers]
+
+    misses.inc()
+    answers = await generate()
+    answer_cache.put(key, {
+        "context_key": context_key,
+        "embedding": _unit(em_query) if em_query is not None and ANSWER_CACHE_SIMILARITY_THRESHOLD else None,
+        "answers": [answer.model_copy(deep=True) for answer in answers],
+    })
+    cache_size.set(len(answer_cache))
+    return answers
+
+def invalidate_answer_cache() -> int:
+    """Drop every cached answer, e.g. after the Qdrant collection has been re-indexed"""
+    dropped = len(answer_cache)
+    answer_cache.clear()
+    invalidations.inc()
+    cache_size.set(0)
+    logger.info(f"Invalidated {dropped} cached answers")
+    return dropped
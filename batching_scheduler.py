@@ -0,0 +1,114 @@
+#batching_scheduler.py
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+from qdrant_client.models import ScoredPoint
+
+from app.core.logger import logger
+from app.core.metrics import histogram
+from app.core.utils.embedding_cache import get_cached_embedding, get_cached_embeddings
+from app.core.utils.qdrant_helpers import batch_search_documents, search_documents
+from app.core.utils.rate_limiter import Priority, current_priority
+
+MICRO_BATCHING_ENABLED = os.getenv("MICRO_BATCHING_ENABLED", "true").lower() == "true"
+# Longest time the first call in a batch waits for others to join
+MICRO_BATCH_WINDOW_MS = float(os.getenv("MICRO_BATCH_WINDOW_MS", "5"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "32"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collect concurrent single-item calls for up to max_wait_ms (or until max_batch_size items
+    are waiting), run them through one batched call and hand each caller its own result.
+    The batched call runs at the most urgent priority among the callers that joined it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+        max_wait_ms: float = MICRO_BATCH_WINDOW_MS
+    ):
+        self.name = name
+        self.process = process
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        # (item, future, queued at, caller's priority)
+        self._pending: List[Tuple[T, asyncio.Future, float, Priority]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batch_sizes = histogram(f"{name}_batch_size", BATCH_SIZE_BUCKETS)
+        self.wait_seconds = histogram(f"{name}_batch_wait_seconds", WAIT_BUCKETS)
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, loop.time(), current_priority.get()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future, float, Priority]]) -> None:
+        # The task inherited the context of whichever caller opened the batch; set the
+        # priority from all of them (task-local, so callers' own contexts are untouched)
+        current_priority.set(min(priority for _, _, _, priority in batch))
+        now = asyncio.get_running_loop().time()
+        self.batch_sizes.observe(len(batch))
+        for _, _, queued_at, _ in batch:
+            self.wait_seconds.observe(now - queued_at)
+
+        try:
+            results = await self.process([item for item, _, _, _ in batch])
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {str(e)}")
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+embedding_batcher: MicroBatcher[str, List[float]] = MicroBatcher("embedding", get_cached_embeddings)
+_search_batchers: Dict[int, MicroBatcher[List[float], List[ScoredPoint]]] = {}
+
+def _search_batcher(limit: int) -> MicroBatcher[List[float], List[ScoredPoint]]:
+    # search_batch requests share one limit per batcher so results keep a uniform shape
+    if limit not in _search_batchers:
+        _search_batchers[limit] = MicroBatcher(
+            "vector_search",
+            lambda em_queries: batch_search_documents(em_queries, limit),
+        )
+    return _search_batchers[limit]
+
+async def embed_query(text: str) -> List[float]:
+    """Embed a single text, sharing an embeddings request with concurrent callers"""
+    if not MICRO_BATCHING_ENABLED:
+        return await get_cached_embedding(text)
+    return await embedding_batcher.submit(text)
+
+async def search_query(em_query: List[float], limit: int = 5) -> List[ScoredPoint]:
+    """Search a single query, sharing a search_batch request with concurrent callers"""
+    if not MICRO_BATCHING_ENABLED:
+        return await search_documents(em_query, limit)
+    return await _search_batcher(limit).submit(em_query)
@@ -0,0 +1,58 @@
+"""
+Compare Qdrant round-trips and wall time for per-question search vs. chunked search_batch.
+
+A fake client with a fixed per-request latency stands in for Qdrant Cloud:
+
+    python -m benchmarks.bench_batch_search
+"""
+import asyncio
+import math
+import random
+import time
+
+from qdrant_client.models import ScoredPoint
+
+from app.core.utils import qdrant_helpers
+from app.core.utils.qdrant_helpers import chunked_batch_search_documents, search_documents
+
+LATENCY = 0.05
+DIM = 1536
+
+class FakeQdrantClient:
+    def __init__(self):
+        self.calls = 0
+
+    def _points(self, limit):
+        return [ScoredPoint(id=i, version=0, score=random.random(), payload={}) for i in range(limit)]
+
+    async def search(self, collection_name, query_vector, limit):
+        self.calls += 1
+        await asyncio.sleep(LATENCY)
+        return self._points(limit)
+
+    async def search_batch(self, collection_name, requests):
+        self.calls += 1
+        await asyncio.sleep(LATENCY)
+        return [self._points(r.limit) for r in requests]
+
+async def main():
+    batch_size = qdrant_helpers.QDRANT_SEARCH_BATCH_SIZE
+    print(f"{'questions':>9} {'per-question':>14} {'batched':>9} {'expected':>9} {'t_single':>9} {'t_batch':>8}")
+    for n in (1, 10, 30, 100, 500):
+        queries = [[random.random() for _ in range(DIM)] for _ in range(n)]
+
+        qdrant_helpers.qdrant_client = client = FakeQdrantClient()
+        start = time.perf_counter()
+        for query in queries:
+            await search_documents(query)
+        single_calls, single_time = client.calls, time.perf_counter() - start
+
+        qdrant_helpers.qdrant_client = client = FakeQdrantClient()
+        start = time.perf_counter()
+        await chunked_batch_search_documents(queries, limit=5)
+        batch_calls, batch_time = client.calls, time.perf_counter() - start
+
+        print(f"{n:>9} {single_calls:>14} {batch_calls:>9} {math.ceil(n / batch_size):>9} {single_time:>8.2f}s {batch_time:>7.2f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Count Postgres round-trips for persisting a multiple-questions response: the previous
+per-answer add_message loop vs. one add_messages call.
+
+Round-trips are counted on a fake connection: BEGIN and COMMIT count one each, and
+execute/executemany count one each (asyncpg pipelines executemany arguments).
+
+    python -m benchmarks.bench_bulk_persistence
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from app.core.models import DocReference, MessageType, PendingMessage
+from app.core.utils import persist_helpers
+
+class CountingConnection:
+    def __init__(self):
+        self.round_trips = 0
+
+    async def execute(self, query, *args):
+        self.round_trips += 1
+
+    async def executemany(self, query, args):
+        self.round_trips += 1
+
+conn = CountingConnection()
+
+@asynccontextmanager
+async def fake_get_connection():
+    conn.round_trips += 1  # BEGIN
+    yield conn
+    conn.round_trips += 1  # COMMIT
+
+async def legacy_add_message(msg: PendingMessage):
+    """The per-row insert loop add_message used before bulk persistence"""
+    async with fake_get_connection() as c:
+        await c.execute("INSERT INTO messages ...")
+        for _ in msg.doc_references:
+            await c.execute("INSERT INTO reference_links ...")
+
+def make_messages(questions: int, n: int, refs: int):
+    conversation_id = uuid4()
+    return [
+        PendingMessage(
+            text="answer",
+            doc_references=[DocReference(id=uuid4(), label="doc", url="https://example.com") for _ in range(refs)],
+            msg_type=MessageType.system,
+            conversation_id=conversation_id,
+            sender="assistant",
+        )
+        for _ in range(questions * n)
+    ]
+
+async def main():
+    persist_helpers.get_connection = fake_get_connection
+    print(f"{'questions':>9} {'n':>3} {'refs':>4} {'before':>7} {'after':>6}")
+    for questions, n, refs in ((1, 3, 3), (20, 3, 3), (50, 3, 5), (200, 1, 3)):
+        messages = make_messages(questions, n, refs)
+
+        conn.round_trips = 0
+        for msg in messages:
+            await legacy_add_message(msg)
+        before = conn.round_trips
+
+        conn.round_trips = 0
+        await persist_helpers.add_messages(messages)
+        after = conn.round_trips
+
+        print(f"{questions:>9} {n:>3} {refs:>4} {before:>7} {after:>6}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+Compare deck assembly from full source packages (build_combined_deck) with splicing
+pre-extracted fragments (assemble_deck).
+
+    python -m benchmarks.bench_deck_assembly slide1.pptx slide2.pptx ... [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+from app.core.utils.pptx_helpers import build_combined_deck
+from app.core.utils.slide_fragments import assemble_deck, extract_fragment
+
+def timed(fn, *args, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs), result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("decks", nargs="+")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=1, help="repeat the deck list to simulate larger outputs")
+    args = parser.parse_args()
+
+    sources = []
+    for path in args.decks:
+        with open(path, "rb") as f:
+            sources.append((path, f.read()))
+    sources = sources * args.copies
+
+    extract_time, fragments = timed(lambda: [extract_fragment(url, data) for url, data in sources], repeat=1)
+    current_time, current_deck = timed(build_combined_deck, sources, repeat=args.repeat)
+    fragment_time, fragment_deck = timed(assemble_deck, fragments, repeat=args.repeat)
+
+    print(f"sources:                      {len(sources)}")
+    print(f"one-off fragment extraction:  {extract_time:.3f}s")
+    print(f"build_combined_deck (median): {current_time:.3f}s  {len(current_deck)} bytes")
+    print(f"assemble_deck (median):       {fragment_time:.3f}s  {len(fragment_deck)} bytes")
+    print(f"speedup:                      {current_time / fragment_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
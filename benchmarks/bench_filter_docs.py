@@ -0,0 +1,56 @@
+"""
+Compare per-query filter_docs with filter_docs_batch on synthetic search_batch results:
+
+    python -m benchmarks.bench_filter_docs
+"""
+import random
+import time
+
+from qdrant_client.models import ScoredPoint
+
+from app.core.utils.response_helpers import filter_docs, filter_docs_batch
+from app.core.utils.shared.constants import PERCENTILE
+
+LIMIT = 5
+REPEATS = 5
+
+def make_doc_sets(n, limit=LIMIT):
+    doc_sets = []
+    for q in range(n):
+        doc_sets.append([
+            ScoredPoint(
+                id=q * limit + i,
+                version=0,
+                score=random.random(),
+                payload={
+                    "answer": f"answer {i}" if random.random() > 0.1 else None,
+                    "source": f"doc-{random.randrange(limit)}.pptx",
+                    "title": f"Doc {i}",
+                },
+            )
+            for i in range(limit)
+        ])
+    return doc_sets
+
+def best_of(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    print(f"{'queries':>8} {'per-query':>10} {'batched':>9} {'speedup':>8} {'equal':>6}")
+    for n in (1_000, 10_000):
+        doc_sets = make_doc_sets(n)
+        t_single, single = best_of(lambda: [filter_docs(doc_set, PERCENTILE) for doc_set in doc_sets])
+        t_batch, batched = best_of(lambda: filter_docs_batch(doc_sets, PERCENTILE))
+        equal = all(
+            a[0] == b[0] and list(a[1]) == list(b[1])
+            for a, b in zip(single, batched)
+        )
+        print(f"{n:>8} {t_single * 1000:>8.1f}ms {t_batch * 1000:>7.1f}ms {t_single / t_batch:>7.1f}x {str(equal):>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Recall@k and latency of the hot index (flat and, if hnswlib is installed, HNSW) against
+qdrant_client's local in-memory mode, which searches exactly and serves as ground truth:
+
+    python -m benchmarks.bench_hot_index
+"""
+import asyncio
+import random
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, PointStruct, VectorParams
+
+from app.core.utils import hot_index as hot_index_module
+from app.core.utils.hot_index import HotVectorIndex
+
+COLLECTION = "bench_hot_index"
+DIM = 1536
+LIMIT = 5
+QUERIES = 200
+
+async def build_collection(client, n):
+    await client.create_collection(COLLECTION, vectors_config=VectorParams(size=DIM, distance=Distance.COSINE))
+    vectors = np.random.default_rng(0).standard_normal((n, DIM)).astype(np.float32)
+    for start in range(0, n, 1000):
+        await client.upsert(COLLECTION, points=[
+            PointStruct(id=i, vector=vectors[i].tolist(), payload={"source": f"doc-{i % 50}.pptx", "answer": f"answer {i}"})
+            for i in range(start, min(start + 1000, n))
+        ])
+    return vectors
+
+async def main():
+    print(f"{'points':>7} {'mode':>5} {'recall@5':>9} {'qdrant/q':>10} {'hot/q':>9} {'hot batch/q':>12}")
+    for n in (1_000, 10_000):
+        client = AsyncQdrantClient(location=":memory:")
+        vectors = await build_collection(client, n)
+        # Queries near stored points, like questions close to indexed answers
+        queries = [
+            (vectors[random.randrange(n)] + 0.5 * np.random.standard_normal(DIM)).tolist()
+            for _ in range(QUERIES)
+        ]
+
+        start = time.perf_counter()
+        truth = [await client.search(COLLECTION, query_vector=q, limit=LIMIT) for q in queries]
+        t_qdrant = (time.perf_counter() - start) / QUERIES
+
+        modes = ["flat"] + (["hnsw"] if hot_index_module.hnswlib is not None else [])
+        for mode in modes:
+            index = HotVectorIndex(client, COLLECTION, mode=mode)
+            await index.refresh()
+
+            start = time.perf_counter()
+            single = [(await index.search([q], LIMIT))[0] for q in queries]
+            t_single = (time.perf_counter() - start) / QUERIES
+
+            start = time.perf_counter()
+            await index.search(queries, LIMIT)
+            t_batch = (time.perf_counter() - start) / QUERIES
+
+            recall = np.mean([
+                len({p.id for p in got} & {p.id for p in expected}) / LIMIT
+                for got, expected in zip(single, truth)
+            ])
+            print(f"{n:>7} {mode:>5} {recall:>9.3f} {t_qdrant * 1000:>8.2f}ms {t_single * 1000:>7.2f}ms {t_batch * 1000:>10.3f}ms")
+        await client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
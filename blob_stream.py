@@ -0,0 +1,125 @@
+#blob_stream.py
+import base64
+import io
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from azure.storage.blob import BlobBlock, BlobClient, ContentSettings
+
+from app.core.database import AZURE_STORAGE_CONNECTION_STRING
+from app.core.logger import logger
+
+BLOB_STREAM_BLOCK_SIZE = int(os.getenv("BLOB_STREAM_BLOCK_SIZE", str(4 * 1024 * 1024)))
+# Blocks staged in parallel; peak buffered output is roughly (concurrency + 1) * block size
+BLOB_STREAM_CONCURRENCY = int(os.getenv("BLOB_STREAM_CONCURRENCY", "4"))
+# A writer stops this long before its deadline, so a commit can't land after the caller gave up
+BLOB_STREAM_COMMIT_MARGIN = float(os.getenv("BLOB_STREAM_COMMIT_MARGIN", "5"))
+
+class WriterAbandoned(Exception):
+    """The writer's deadline passed, so whoever started it has stopped waiting for the blob"""
+
+class BlockBlobWriter(io.RawIOBase):
+    """
+    Non-seekable, write-only file object that stages each full block as it is written and
+    commits the block list on close. Meant for synchronous writers such as ZipFile/prs.save,
+    so it uses the sync blob client and runs inside worker processes or threads.
+    If close() is never reached the staged blocks are left uncommitted and expire on their own.
+    Once within BLOB_STREAM_COMMIT_MARGIN of deadline (a time.time() value) it raises
+    WriterAbandoned instead of staging or committing.
+    """
+
+    def __init__(
+        self,
+        blob_client: BlobClient,
+        block_size: int = BLOB_STREAM_BLOCK_SIZE,
+        concurrency: int = BLOB_STREAM_CONCURRENCY,
+        content_type: Optional[str] = None,
+        deadline: Optional[float] = None
+    ):
+        super().__init__()
+        self.blob_client = blob_client
+        self.block_size = block_size
+        self.concurrency = max(1, concurrency)
+        self.content_type = content_type
+        self.deadline = deadline
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._blocks: List[BlobBlock] = []
+        self._staging: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    @property
+    def url(self) -> str:
+        return self.blob_client.url
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _check_deadline(self) -> None:
+        if self.deadline is not None and time.time() > self.deadline - BLOB_STREAM_COMMIT_MARGIN:
+            raise WriterAbandoned(f"Deadline passed, not committing {self.url}")
+
+    def _stage(self, data: bytes) -> None:
+        self._check_deadline()
+        # Wait for the oldest upload before buffering another block
+        while len(self._staging) >= self.concurrency:
+            self._staging.pop(0).result()
+        block_id = base64.b64encode(f"{len(self._blocks):08d}".encode()).decode()
+        self._blocks.append(BlobBlock(block_id=block_id))
+        self._staging.append(self._executor.submit(self.blob_client.stage_block, block_id, data))
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._stage(bytes(self._buffer))
+                self._buffer.clear()
+            for future in self._staging:
+                future.result()
+            self._check_deadline()
+            self.blob_client.commit_block_list(
+                self._blocks,
+                content_settings=ContentSettings(content_type=self.content_type) if self.content_type else None
+            )
+            logger.info(f"Committed {len(self._blocks)} blocks ({self.bytes_written} bytes) to {self.url}")
+        finally:
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self) -> None:
+        """Drop the writer without committing; staged blocks are garbage-collected by the service"""
+        if self.closed:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._buffer.clear()
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Only a writer that finished cleanly commits its blob
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __del__(self) -> None:
+        self.abort()
+
+def open_block_blob_writer(
+    container: str,
+    blob_name: str,
+    content_type: Optional[str] = None,
+    deadline: Optional[float] = None
+) -> BlockBlobWriter:
+    blob_client = BlobClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING, container, blob_name)
+    return BlockBlobWriter(blob_client, content_type=content_type, deadline=deadline)
@@ -0,0 +1,70 @@
+#cache_helpers.py
+import os
+import stat
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional, Tuple
+
+class TTLLRUCache:
+    """
+    In-process LRU cache bounded by entry count and entry age.
+    A ttl of None or 0 disables age-based expiry.
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None, on_evict: Optional[Callable[[], None]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl or None
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        stored_at, value = entry
+        if self._expired(stored_at):
+            del self._data[key]
+            self._evicted()
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self._evicted()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Iterate over live entries without changing their recency"""
+        for key, (stored_at, value) in list(self._data.items()):
+            if self._expired(stored_at):
+                del self._data[key]
+                self._evicted()
+            else:
+                yield key, value
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def _evicted(self) -> None:
+        if self.on_evict is not None:
+            self.on_evict()
+
+def ensure_private_dir(directory: str) -> None:
+    """Create directory with mode 0700, refusing one that another user could write into"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{directory} must be a directory owned by this user with mode 0700")
@@ -0,0 +1,48 @@
+#chat_scheduler.py
+import os
+from typing import Dict, List
+
+from app.core.models import GPTModelInfo
+from app.core.utils.embedding_helpers import get_encoding
+from app.core.utils.llm.openai_helpers import get_chat_completion
+from app.core.utils.rate_limiter import TokenBucketLimiter
+
+# Rates are per 1K tokens, like EMBEDDING_MODEL's
+CHAT_MODEL = GPTModelInfo(
+    name=os.getenv("CHAT_MODEL", "gpt-4o"),
+    input_rate=float(os.getenv("CHAT_INPUT_RATE", "0.0025")),
+    output_rate=float(os.getenv("CHAT_OUTPUT_RATE", "0.01")),
+    max_token=int(os.getenv("CHAT_MAX_TOKEN", "128000")),
+    encoding=os.getenv("CHAT_ENCODING", "o200k_base"),
+    is_azure=os.getenv("AZURE_OPENAI_ENDPOINT") is not None,
+)
+# Provider quota for the chat deployment
+CHAT_RPM = int(os.getenv("CHAT_RPM", "500"))
+CHAT_TPM = int(os.getenv("CHAT_TPM", "300000"))
+# Completion tokens reserved per choice until the response reports actual usage
+CHAT_EXPECTED_OUTPUT_TOKENS = int(os.getenv("CHAT_EXPECTED_OUTPUT_TOKENS", "500"))
+
+chat_limiter = TokenBucketLimiter(CHAT_MODEL, CHAT_RPM, CHAT_TPM)
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Prompt tokens of a chat request, including the per-message framing overhead"""
+    encoder = get_encoding(CHAT_MODEL.encoding)
+    return 3 + sum(4 + len(encoder.encode(str(m.get("content") or ""), disallowed_special=())) for m in messages)
+
+async def scheduled_chat_completion(messages: List[Dict[str, str]], n: int = 1, **kwargs):
+    """
+    get_chat_completion behind the process-wide chat rate limiter. Priority follows
+    rate_limiter.current_priority, so bulk work waits behind interactive requests.
+    """
+    reserved = await chat_limiter.acquire(count_message_tokens(messages) + n * CHAT_EXPECTED_OUTPUT_TOKENS)
+    try:
+        response = await get_chat_completion(messages, n=n, **kwargs)
+    except Exception:
+        chat_limiter.release(reserved)
+        raise
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        chat_limiter.settle(reserved, usage.prompt_tokens, usage.completion_tokens)
+    else:
+        chat_limiter.settle(reserved, count_message_tokens(messages), n * CHAT_EXPECTED_OUTPUT_TOKENS)
+    return response
@@ -0,0 +1,68 @@
+#context_packing.py
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+from app.core.metrics import counter, histogram
+from app.core.utils.chat_scheduler import CHAT_EXPECTED_OUTPUT_TOKENS, CHAT_MODEL
+from app.core.utils.embedding_cache import normalize_text
+from app.core.utils.embedding_helpers import get_encoding
+
+# Tokens of retrieved passages allowed into one system prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# A passage that doesn't fit is truncated only if at least this many tokens of it would remain
+CONTEXT_MIN_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MIN_PASSAGE_TOKENS", "64"))
+
+TOKEN_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+tokens_in = counter("context_tokens_retrieved_total")
+tokens_saved = counter("context_tokens_saved_total")
+saved_per_request = histogram("context_tokens_saved", TOKEN_BUCKETS)
+duplicates_dropped = counter("context_duplicate_passages_total")
+passages_truncated = counter("context_truncated_passages_total")
+
+@lru_cache(maxsize=4096)
+def _tokens(text: str, encoding: str) -> Tuple[int, ...]:
+    # Retrieved passages repeat across questions, so their encodings are cached
+    return tuple(get_encoding(encoding).encode(text, disallowed_special=()))
+
+def pack_context(
+    passages: List[str],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    separator: str = "\n",
+    encoding: str = CHAT_MODEL.encoding
+) -> List[str]:
+    """
+    Fit retrieved passages (best-scoring first, as search returns them) into a token budget:
+    duplicates are dropped, passages are kept in order while they fit, and the first one that
+    doesn't is truncated if enough of it remains. Join the result with the same separator.
+    """
+    budget = min(budget, CHAT_MODEL.max_token - CHAT_EXPECTED_OUTPUT_TOKENS)
+    separator_tokens = len(_tokens(separator, encoding))
+    seen = set()
+    packed: List[str] = []
+    total = used = 0
+    for i, passage in enumerate(passages):
+        n_tokens = len(_tokens(passage, encoding))
+        # As if every passage were joined, so total and used both include separators
+        total += n_tokens + (separator_tokens if i else 0)
+        key = normalize_text(passage)
+        if key in seen:
+            duplicates_dropped.inc()
+            continue
+        seen.add(key)
+
+        remaining = budget - used - (separator_tokens if packed else 0)
+        if n_tokens <= remaining:
+            packed.append(passage)
+            used += n_tokens + (separator_tokens if len(packed) > 1 else 0)
+        elif remaining >= CONTEXT_MIN_PASSAGE_TOKENS:
+            packed.append(get_encoding(encoding).decode(list(_tokens(passage, encoding)[:remaining])))
+            used += remaining + (separator_tokens if len(packed) > 1 else 0)
+            passages_truncated.inc()
+
+    saved = max(0, total - used)
+    tokens_in.inc(total)
+    tokens_saved.inc(saved)
+    saved_per_request.observe(saved)
+    return packed
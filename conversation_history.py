@@ -0,0 +1,95 @@
+#conversation_history.py
+import json
+import os
+from typing import Any, Dict, Iterable, List
+from uuid import UUID
+
+from app.core.database import get_read_connection, register_statement
+from app.core.logger import logger
+from app.core.metrics import counter
+from app.core.utils.cache_helpers import TTLLRUCache
+
+# Conversations kept in the history cache, and how many recent messages each entry holds
+HISTORY_CACHE_CONVERSATIONS = int(os.getenv("HISTORY_CACHE_CONVERSATIONS", "1000"))
+HISTORY_CACHE_MESSAGES = int(os.getenv("HISTORY_CACHE_MESSAGES", "20"))
+HISTORY_CACHE_TTL_SECONDS = int(os.getenv("HISTORY_CACHE_TTL_SECONDS", "600"))
+
+MESSAGE_COLUMNS = "id, text, file_links, conversation_id, msg_type, timestamp, sender"
+
+register_statement("last_messages", f'''
+SELECT {MESSAGE_COLUMNS} FROM messages
+WHERE conversation_id = $1
+ORDER BY timestamp DESC
+LIMIT $2;
+''')
+
+hits = counter("history_cache_hits_total")
+misses = counter("history_cache_misses_total")
+
+# conversation_id -> {"messages": newest-last list, "complete": True if it is the whole conversation}
+history_cache = TTLLRUCache(HISTORY_CACHE_CONVERSATIONS, HISTORY_CACHE_TTL_SECONDS)
+
+def invalidate_history(conversation_ids: Iterable[UUID]) -> None:
+    for conversation_id in set(conversation_ids):
+        history_cache.pop(conversation_id)
+
+async def fetch_last_messages(conversation_id: UUID, n: int = 1) -> List[Dict[str, Any]]:
+    """
+    Fetch the n most recent messages of a conversation in chronological order.
+    Reads an index range instead of the whole conversation, and serves repeat reads from cache.
+    """
+    entry = history_cache.get(conversation_id)
+    if entry is not None and (entry["complete"] or len(entry["messages"]) >= n):
+        hits.inc()
+        return entry["messages"][-n:]
+
+    misses.inc()
+    limit = max(n, HISTORY_CACHE_MESSAGES)
+    # Primary, not a replica: refine reads back the message it has just written
+    async with get_read_connection(replica=False) as conn:
+        try:
+            rows = await (await conn.prepared("last_messages")).fetch(conversation_id, limit)
+        except Exception as e:
+            logger.error(f"Error fetching last messages: {str(e)}")
+            raise
+
+    messages = [dict(row) for row in reversed(rows)]
+    history_cache.put(conversation_id, {"messages": messages, "complete": len(rows) < limit})
+    return messages[-n:]
+
+async def fetch_messages_nested(conversation_id: UUID) -> List[Dict[str, Any]]:
+    """
+    Fetch every message of a conversation with its reference links aggregated into a
+    "references" list, one row per message, in a single query.
+    """
+    async with get_read_connection() as conn:
+        try:
+            rows = await conn.fetch(
+                '''
+                SELECT M.id, M.text, M.file_links, M.conversation_id,
+                       M.msg_type, M.timestamp, M.sender,
+                       COALESCE(
+                           json_agg(json_build_object(
+                               'id', RL.id, 'doc_id', RL.doc_id, 'label', RL.label,
+                               'url', RL.url, 'image_url', RL.image_url, 'slide', RL.slide
+                           )) FILTER (WHERE RL.id IS NOT NULL),
+                           '[]'
+                       ) AS references
+                FROM messages M
+                LEFT JOIN reference_links RL ON M.id = RL.message_id
+                WHERE M.conversation_id = $1
+                GROUP BY M.id
+                ORDER BY M.timestamp ASC;
+                ''',
+                conversation_id
+            )
+        except Exception as e:
+            logger.exception(f"Error fetching nested messages: {str(e)}")
+            raise
+
+    messages = []
+    for row in rows:
+        message = dict(row)
+        message["references"] = json.loads(message["references"])
+        messages.append(message)
+    return messages
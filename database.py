@@ -1,12 +1,13 @@
 import os
+import time
 from qdrant_client import AsyncQdrantClient
 from azure.storage.blob.aio import BlobServiceClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
 import asyncpg
 from contextlib import asynccontextmanager
+from typing import Dict
 
 from app.core.logger import logger
+from app.core.metrics import counter, gauge, histogram
 
 qdrant_client = AsyncQdrantClient(
     url=os.getenv("QDRANT_CLOUD_URL"), 
@@ -16,21 +17,138 @@ qdrant_client = AsyncQdrantClient(
 ### SQL Related
 
 connection_url = os.getenv("DATABASE_URL")
-engine = create_engine(connection_url, echo=True)
-Session = sessionmaker(engine)
+# Optional replica for read paths; without one, reads share the primary's pool
+read_connection_url = os.getenv("DATABASE_READ_URL")
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_READ_POOL_MAX_SIZE = int(os.getenv("DB_READ_POOL_MAX_SIZE", str(DB_POOL_MAX_SIZE)))
+# Connections are replaced after this many queries / seconds idle
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+
+QUERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+pool_wait_seconds = histogram("db_pool_wait_seconds", QUERY_BUCKETS)
+pool_acquisitions = counter("db_pool_acquisitions_total")
+pool_in_use = gauge("db_pool_connections_in_use")
+query_seconds = histogram("db_query_seconds", QUERY_BUCKETS)
+
+# name -> SQL for hot queries that run as named prepared statements
+PREPARED_STATEMENTS: Dict[str, str] = {}
+
+def register_statement(name: str, query: str) -> str:
+    """Register a hot query to run as a named prepared statement via conn.prepared(name)"""
+    PREPARED_STATEMENTS[name] = query
+    return name
+
+class TimedStatement:
+    """Prepared statement wrapper recording latency per statement name"""
+
+    def __init__(self, statement: asyncpg.prepared_stmt.PreparedStatement, name: str):
+        self._statement = statement
+        self._histogram = histogram(f"db_statement_{name}_seconds", QUERY_BUCKETS)
+
+    async def _timed(self, method: str, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await getattr(self._statement, method)(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._histogram.observe(elapsed)
+            query_seconds.observe(elapsed)
+
+    async def fetch(self, *args, **kwargs):
+        return await self._timed("fetch", *args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        return await self._timed("fetchrow", *args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        return await self._timed("fetchval", *args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        return await self._timed("executemany", *args, **kwargs)
+
+class InstrumentedConnection(asyncpg.Connection):
+    """asyncpg connection that times every query and keeps its named prepared statements"""
+
+    async def _timed(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            query_seconds.observe(time.perf_counter() - start)
+
+    async def execute(self, *args, **kwargs):
+        return await self._timed(super().execute, *args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        return await self._timed(super().executemany, *args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        return await self._timed(super().fetch, *args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        return await self._timed(super().fetchrow, *args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        return await self._timed(super().fetchval, *args, **kwargs)
+
+    async def prepared(self, name: str) -> TimedStatement:
+        statements = self.__dict__.setdefault("_named_statements", {})
+        if name not in statements:
+            statement = await self.prepare(PREPARED_STATEMENTS[name], name=f"rfx_{name}")
+            statements[name] = TimedStatement(statement, name)
+        return statements[name]
 
 pool = None 
+read_pool = None
+
+def _pool_kwargs(max_size: int) -> dict:
+    return dict(
+        min_size=min(DB_POOL_MIN_SIZE, max_size),
+        max_size=max_size,
+        max_queries=DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME,
+        command_timeout=DB_COMMAND_TIMEOUT,
+        connection_class=InstrumentedConnection,
+    )
 
 async def create_pool():
-    global pool
-    pool = await asyncpg.create_pool(dsn=connection_url)
+    global pool, read_pool
+    pool = await asyncpg.create_pool(dsn=connection_url, **_pool_kwargs(DB_POOL_MAX_SIZE))
+    if not read_connection_url or read_connection_url == connection_url:
+        # A second pool against the primary would only double the connections per worker
+        read_pool = pool
+        return
+    read_pool = await asyncpg.create_pool(
+        dsn=read_connection_url,
+        server_settings={"default_transaction_read_only": "on"},
+        **_pool_kwargs(DB_READ_POOL_MAX_SIZE)
+    )
 
 async def close_pool():
     await pool.close()
+    if read_pool is not pool:
+        await read_pool.close()
+
+@asynccontextmanager
+async def _acquire(from_pool):
+    start = time.perf_counter()
+    async with from_pool.acquire() as connection:
+        pool_wait_seconds.observe(time.perf_counter() - start)
+        pool_acquisitions.inc()
+        pool_in_use.inc()
+        try:
+            yield connection
+        finally:
+            pool_in_use.dec()
 
 @asynccontextmanager
 async def get_connection():
-    async with pool.acquire() as connection:
+    async with _acquire(pool) as connection:
         async with connection.transaction():
             try:
                 yield connection
@@ -39,8 +157,25 @@ async def get_connection():
                 await connection.rollback()
                 raise
 
+@asynccontextmanager
+async def get_read_connection(replica: bool = True):
+    """
+    Connection without an explicit transaction, for pure reads. replica=False reads from
+    the primary, for read-your-writes paths that can't tolerate replica lag.
+    """
+    async with _acquire(read_pool if replica else pool) as connection:
+        yield connection
+
 account_name = os.getenv("STORAGE_ACCOUNT_NAME")
 account_key = os.getenv("STORAGE_ACCOUNT_KEY")
 AZURE_STORAGE_CONNECTION_STRING = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
 
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
\ No newline at end of file
+# Upload chunking for every client derived from blob_service_client
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024)))
+UPLOAD_SINGLE_PUT_SIZE = int(os.getenv("UPLOAD_SINGLE_PUT_SIZE", str(8 * 1024 * 1024)))
+
+blob_service_client = BlobServiceClient.from_connection_string(
+    AZURE_STORAGE_CONNECTION_STRING,
+    max_block_size=UPLOAD_BLOCK_SIZE,
+    max_single_put_size=UPLOAD_SINGLE_PUT_SIZE,
+)
\ No newline at end of file
@@ -0,0 +1,154 @@
+#embedding_cache.py
+import asyncio
+import hashlib
+import os
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.core.database import get_connection, get_read_connection, register_statement
+from app.core.logger import logger
+from app.core.metrics import counter, gauge
+from app.core.utils.cache_helpers import TTLLRUCache
+from app.core.utils.embedding_helpers import EMBEDDING_MODEL, get_batch_embeddings
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500000"))
+# Prune the persistent tier, in the background, after this many inserted rows
+EMBEDDING_CACHE_PRUNE_EVERY = int(os.getenv("EMBEDDING_CACHE_PRUNE_EVERY", "1000"))
+
+memory_hits = counter("embedding_cache_memory_hits_total")
+persistent_hits = counter("embedding_cache_persistent_hits_total")
+misses = counter("embedding_cache_misses_total")
+evictions = counter("embedding_cache_memory_evictions_total")
+persistent_errors = counter("embedding_cache_persistent_errors_total")
+memory_size = gauge("embedding_cache_memory_entries")
+
+memory_cache = TTLLRUCache(EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL_SECONDS, on_evict=evictions.inc)
+_inserted_since_prune = 0
+_prune_task: Optional[asyncio.Task] = None
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", str(text)).split())
+
+def cache_key(text: str, model: str = EMBEDDING_MODEL.name) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+register_statement(
+    "embedding_cache_lookup",
+    'SELECT key, embedding FROM embedding_cache WHERE key = ANY($1::text[]) AND created_on > $2;'
+)
+
+async def _fetch_persistent(keys: List[str]) -> Dict[str, List[float]]:
+    cutoff = datetime.now() - timedelta(seconds=EMBEDDING_CACHE_TTL_SECONDS)
+    async with get_read_connection() as conn:
+        rows = await (await conn.prepared("embedding_cache_lookup")).fetch(keys, cutoff)
+    return {row["key"]: list(row["embedding"]) for row in rows}
+
+async def _store_persistent(entries: Dict[str, List[float]]) -> None:
+    global _inserted_since_prune
+    async with get_connection() as conn:
+        await conn.executemany(
+            '''
+            INSERT INTO embedding_cache(key, model, embedding, created_on)
+            VALUES($1, $2, $3, $4)
+            ON CONFLICT (key) DO UPDATE SET embedding = EXCLUDED.embedding, created_on = EXCLUDED.created_on;
+            ''',
+            [(key, EMBEDDING_MODEL.name, embedding, datetime.now()) for key, embedding in entries.items()]
+        )
+    _inserted_since_prune += len(entries)
+    if _inserted_since_prune >= EMBEDDING_CACHE_PRUNE_EVERY:
+        _inserted_since_prune = 0
+        schedule_embedding_cache_prune()
+
+def schedule_embedding_cache_prune() -> None:
+    """Prune off the request path, unless a prune is already running"""
+    global _prune_task
+    if _prune_task is None or _prune_task.done():
+        _prune_task = asyncio.get_running_loop().create_task(prune_embedding_cache())
+
+# Called from the app lifespan, before the pool closes
+async def stop_embedding_cache_prune() -> None:
+    if _prune_task is not None and not _prune_task.done():
+        _prune_task.cancel()
+        try:
+            await _prune_task
+        except asyncio.CancelledError:
+            pass
+
+async def prune_embedding_cache() -> None:
+    """
+    Remove persistent entries older than the TTL and keep at most EMBEDDING_CACHE_MAX_ROWS newest rows.
+    """
+    try:
+        cutoff = datetime.now() - timedelta(seconds=EMBEDDING_CACHE_TTL_SECONDS)
+        async with get_connection() as conn:
+            await conn.execute('DELETE FROM embedding_cache WHERE created_on < $1;', cutoff)
+            await conn.execute(
+                '''
+                DELETE FROM embedding_cache WHERE key IN (
+                    SELECT key FROM embedding_cache ORDER BY created_on DESC OFFSET $1
+                );
+                ''',
+                EMBEDDING_CACHE_MAX_ROWS
+            )
+    except Exception as e:
+        persistent_errors.inc()
+        logger.error(f"Error pruning embedding cache: {str(e)}")
+
+async def get_cached_embeddings(
+    texts: List[str],
+    embed_missing: Callable[[List[str]], Awaitable[List[List[float]]]] = get_batch_embeddings
+) -> List[List[float]]:
+    """
+    Return embeddings for texts, consulting the in-process LRU, then the persistent table,
+    and embedding only the texts found in neither. Results are returned in input order.
+    """
+    keys = [cache_key(text) for text in texts]
+    found: Dict[str, List[float]] = {}
+
+    for key in set(keys):
+        embedding = memory_cache.get(key)
+        if embedding is not None:
+            found[key] = embedding
+    memory_hits.inc(sum(1 for key in keys if key in found))
+
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing and EMBEDDING_CACHE_PERSISTENT:
+        try:
+            stored = await _fetch_persistent(missing)
+        except Exception as e:
+            persistent_errors.inc()
+            logger.error(f"Error reading embedding cache: {str(e)}")
+            stored = {}
+        persistent_hits.inc(sum(1 for key in keys if key in stored))
+        for key, embedding in stored.items():
+            memory_cache.put(key, embedding)
+        found.update(stored)
+        missing = [key for key in missing if key not in stored]
+
+    if missing:
+        missing_keys = set(missing)
+        misses.inc(sum(1 for key in keys if key in missing_keys))
+        first_text = {}
+        for key, text in zip(keys, texts):
+            first_text.setdefault(key, text)
+        embeddings = await embed_missing([first_text[key] for key in missing])
+        new_entries = dict(zip(missing, embeddings))
+        for key, embedding in new_entries.items():
+            memory_cache.put(key, embedding)
+        found.update(new_entries)
+        if EMBEDDING_CACHE_PERSISTENT:
+            try:
+                await _store_persistent(new_entries)
+            except Exception as e:
+                persistent_errors.inc()
+                logger.error(f"Error writing embedding cache: {str(e)}")
+
+    memory_size.set(len(memory_cache))
+    return [found[key] for key in keys]
+
+async def get_cached_embedding(text: str) -> List[float]:
+    return (await get_cached_embeddings([text]))[0]
@@ -0,0 +1,117 @@
+#embedding_helpers.py
+import asyncio
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+from tenacity import (
+    retry,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app.core.logger import logger
+from app.core.models import GPTModelInfo
+# Same client, endpoint and retry settings as the rest of the OpenAI calls
+from app.core.utils.llm.openai_helpers import client as openai_client
+from app.core.utils.rate_limiter import TokenBucketLimiter
+
+EMBEDDING_MODEL = GPTModelInfo(
+    name=os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+    input_rate=float(os.getenv("EMBEDDING_INPUT_RATE", "0.00002")),
+    output_rate=0.0,
+    max_token=int(os.getenv("EMBEDDING_MAX_TOKEN", "8191")),
+    encoding=os.getenv("EMBEDDING_ENCODING", "cl100k_base"),
+    is_azure=os.getenv("AZURE_OPENAI_ENDPOINT") is not None,
+)
+
+# Limits applied to a single embeddings request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+# Number of embeddings requests in flight at once
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))
+# Provider quota for the embedding deployment
+EMBEDDING_RPM = int(os.getenv("EMBEDDING_RPM", "3000"))
+EMBEDDING_TPM = int(os.getenv("EMBEDDING_TPM", "1000000"))
+
+embedding_limiter = TokenBucketLimiter(EMBEDDING_MODEL, EMBEDDING_RPM, EMBEDDING_TPM)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(name)
+
+def count_tokens(text: str, encoding: str = EMBEDDING_MODEL.encoding) -> int:
+    return len(get_encoding(encoding).encode(text, disallowed_special=()))
+
+def chunk_inputs(token_counts: List[int], max_inputs: int, max_tokens: int) -> List[List[int]]:
+    """
+    Split input positions into consecutive batches bounded by input count and total token count.
+    An input larger than max_tokens is placed in a batch of its own.
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for i, n_tokens in enumerate(token_counts):
+        if current and (len(current) >= max_inputs or current_tokens + n_tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
+async def embed_batch(texts: List[str], n_tokens: Optional[int] = None) -> List[List[float]]:
+    """Embed a list of texts with a single embeddings request, within the embedding rate limits"""
+    if n_tokens is None:
+        n_tokens = sum(count_tokens(text) for text in texts)
+    reserved = await embedding_limiter.acquire(n_tokens)
+    try:
+        response = await openai_client.embeddings.create(model=EMBEDDING_MODEL.name, input=texts)
+    except Exception:
+        embedding_limiter.release(reserved)
+        raise
+    embedding_limiter.settle(reserved, response.usage.prompt_tokens, 0)
+    # The API reports each embedding's input position; don't rely on response order
+    return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+async def get_batch_embeddings(
+    texts: List[str],
+    max_inputs: int = EMBEDDING_BATCH_SIZE,
+    max_tokens: int = EMBEDDING_BATCH_TOKENS,
+    concurrency: int = EMBEDDING_BATCH_CONCURRENCY
+) -> List[List[float]]:
+    """
+    Embed many texts by packing them into as few embeddings requests as the limits allow.
+    Results are returned in the same order as texts.
+    """
+    if not texts:
+        return []
+
+    encoder = get_encoding(EMBEDDING_MODEL.encoding)
+    inputs, token_counts = [], []
+    for text in texts:
+        text = str(text)
+        tokens = encoder.encode(text, disallowed_special=())
+        if len(tokens) > EMBEDDING_MODEL.max_token:
+            logger.warning(f"Truncating embedding input from {len(tokens)} to {EMBEDDING_MODEL.max_token} tokens")
+            tokens = tokens[:EMBEDDING_MODEL.max_token]
+            text = encoder.decode(tokens)
+        inputs.append(text)
+        token_counts.append(len(tokens))
+
+    batches = chunk_inputs(token_counts, max_inputs, max_tokens)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: List[List[float]] = [None] * len(texts)
+
+    async def run(batch: List[int]) -> None:
+        async with semaphore:
+            embeddings = await embed_batch([inputs[i] for i in batch], sum(token_counts[i] for i in batch))
+        for i, embedding in zip(batch, embeddings):
+            results[i] = embedding
+
+    await asyncio.gather(*[run(batch) for batch in batches])
+    logger.info(f"Embedded {len(texts)} inputs in {len(batches)} requests")
+    return results
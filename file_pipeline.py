@@ -0,0 +1,181 @@
+#file_pipeline.py
+import asyncio
+import csv
+import io
+import os
+import time
+from itertools import islice
+from typing import Any, Awaitable, BinaryIO, Callable, Iterator, List
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+from app.core.logger import logger
+from app.core.metrics import counter, histogram
+from app.core.models import BaseResponseDTO
+
+# Rows read, embedded and searched together
+FILE_PIPELINE_CHUNK_ROWS = int(os.getenv("FILE_PIPELINE_CHUNK_ROWS", "256"))
+# Chunks buffered between the read, embed and search stages
+FILE_PIPELINE_QUEUE_CHUNKS = int(os.getenv("FILE_PIPELINE_QUEUE_CHUNKS", "2"))
+FILE_PIPELINE_ANSWER_CONCURRENCY = int(os.getenv("FILE_PIPELINE_ANSWER_CONCURRENCY", "8"))
+# Rows between the reader and the writer at any time, including ones waiting for a slow earlier row
+FILE_PIPELINE_WINDOW_ROWS = int(os.getenv("FILE_PIPELINE_WINDOW_ROWS", "2048"))
+
+ANSWER_FILE_COLUMNS = ["Question", "Answer", "References", "Images"]
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+rows_processed = counter("file_pipeline_rows_total")
+pipeline_seconds = histogram("file_pipeline_seconds", (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+_DONE = object()
+
+def read_questions(file: BinaryIO, content_type: str) -> Iterator[str]:
+    """
+    Yield the first-column value of every data row without loading the sheet: CSV is parsed
+    in chunks, XLSX is read in openpyxl read-only mode. Blank cells are skipped; any other
+    content type raises ValueError.
+    """
+    if content_type == "text/csv":
+        for chunk in pd.read_csv(file, usecols=[0], chunksize=FILE_PIPELINE_CHUNK_ROWS):
+            for value in chunk.iloc[:, 0]:
+                if not pd.isna(value) and str(value).strip():
+                    yield str(value)
+        return
+    if content_type != XLSX_CONTENT_TYPE:
+        raise ValueError(f"Unsupported file type: {content_type}")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        # First sheet, header row skipped, like pd.read_excel
+        sheet = workbook.worksheets[0]
+        for (value,) in sheet.iter_rows(min_row=2, max_col=1, values_only=True):
+            if value is not None and str(value).strip():
+                yield str(value)
+    finally:
+        workbook.close()
+
+class AnswerFileWriter:
+    """Writes answered rows one at a time in create_file's layout; XLSX uses a write-only workbook"""
+
+    def __init__(self, file_type: str):
+        if file_type not in ("csv", "xlsx"):
+            raise ValueError(f"Unsupported output file type: {file_type}")
+        self.file_type = file_type
+        self.buffer = io.BytesIO()
+        if file_type == "csv":
+            self._text = io.TextIOWrapper(self.buffer, encoding="utf-8", newline="")
+            self._csv = csv.writer(self._text)
+            self._append = self._csv.writerow
+        else:
+            self._workbook = Workbook(write_only=True)
+            self._append = self._workbook.create_sheet().append
+        self._append(ANSWER_FILE_COLUMNS)
+
+    def write_row(self, question: str, answers: List[BaseResponseDTO]) -> None:
+        answer = answers[0]
+        refs = answer.referenceLinks or []
+        self._append([
+            question,
+            answer.text,
+            str([ref.url for ref in refs]),
+            str([ref.image_url for ref in refs]),
+        ])
+
+    def close(self) -> io.BytesIO:
+        if self.file_type == "csv":
+            self._text.flush()
+            self._text.detach()
+        else:
+            self._workbook.save(self.buffer)
+        self.buffer.seek(0)
+        return self.buffer
+
+async def run_file_pipeline(
+    rows: Iterator[str],
+    embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+    search: Callable[[List[List[float]]], Awaitable[List[Any]]],
+    select: Callable[[List[Any]], List[Any]],
+    answer: Callable[[str, List[float], Any], Awaitable[List[BaseResponseDTO]]],
+    write: Callable[[str, List[BaseResponseDTO]], None],
+    chunk_rows: int = FILE_PIPELINE_CHUNK_ROWS,
+    queue_chunks: int = FILE_PIPELINE_QUEUE_CHUNKS,
+    concurrency: int = FILE_PIPELINE_ANSWER_CONCURRENCY,
+    window_rows: int = FILE_PIPELINE_WINDOW_ROWS
+) -> int:
+    """
+    Stream rows through read -> embed -> search -> select -> answer -> write, with every
+    stage running concurrently behind bounded queues. select receives a whole chunk's search
+    results and returns one entry per row. Rows are written in input order.
+    Returns the number of rows written; the first failing stage cancels the rest and re-raises.
+    """
+    window = asyncio.Semaphore(max(window_rows, chunk_rows))
+    to_embed: asyncio.Queue = asyncio.Queue(queue_chunks)
+    to_search: asyncio.Queue = asyncio.Queue(queue_chunks)
+    to_answer: asyncio.Queue = asyncio.Queue(concurrency * 2)
+    to_write: asyncio.Queue = asyncio.Queue()
+    written = 0
+
+    async def read():
+        index = 0
+        while True:
+            # Sheet parsing is blocking I/O, so each chunk is pulled in a thread
+            chunk = await asyncio.to_thread(lambda: list(islice(rows, chunk_rows)))
+            if not chunk:
+                break
+            for _ in chunk:
+                await window.acquire()
+            await to_embed.put((index, chunk))
+            index += len(chunk)
+        await to_embed.put(_DONE)
+
+    async def embed_chunks():
+        while (item := await to_embed.get()) is not _DONE:
+            index, chunk = item
+            await to_search.put((index, chunk, await embed(chunk)))
+        await to_search.put(_DONE)
+
+    async def search_chunks():
+        while (item := await to_search.get()) is not _DONE:
+            index, chunk, em_queries = item
+            selected = select(await search(em_queries))
+            for offset, (question, em_query, row) in enumerate(zip(chunk, em_queries, selected)):
+                await to_answer.put((index + offset, question, em_query, row))
+        for _ in range(concurrency):
+            await to_answer.put(_DONE)
+
+    async def answer_rows():
+        while (item := await to_answer.get()) is not _DONE:
+            index, question, em_query, selected = item
+            await to_write.put((index, question, await answer(question, em_query, selected)))
+
+    async def answer_all():
+        await asyncio.gather(*[answer_rows() for _ in range(concurrency)])
+        await to_write.put(_DONE)
+
+    async def write_rows():
+        nonlocal written
+        pending = {}
+        while (item := await to_write.get()) is not _DONE:
+            index, question, answers = item
+            pending[index] = (question, answers)
+            while written in pending:
+                write(*pending.pop(written))
+                written += 1
+                rows_processed.inc()
+                window.release()
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(stage()) for stage in (read, embed_chunks, search_chunks, answer_all, write_rows)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    seconds = time.perf_counter() - start
+    pipeline_seconds.observe(seconds)
+    logger.info(f"Processed {written} rows in {seconds:.2f}s ({written / max(seconds, 1e-9):.1f} rows/s)")
+    return written
@@ -0,0 +1,243 @@
+#hot_index.py
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import Distance, ScoredPoint
+
+from app.core.logger import logger
+from app.core.metrics import counter, gauge, histogram
+
+try:
+    import hnswlib
+except ImportError:  # HNSW mode is optional; the flat NumPy index needs nothing extra
+    hnswlib = None
+
+HOT_INDEX_ENABLED = os.getenv("HOT_INDEX_ENABLED", "false").lower() == "true"
+# "flat" (exact NumPy matmul) or "hnsw" (approximate, needs hnswlib)
+HOT_INDEX_MODE = os.getenv("HOT_INDEX_MODE", "flat")
+# Collections larger than this are left to Qdrant. Every worker process holds its own copy:
+# points x dimensions x 4 bytes (50k x 1536 dims is ~300 MB), twice that while a refresh builds
+HOT_INDEX_MAX_POINTS = int(os.getenv("HOT_INDEX_MAX_POINTS", "50000"))
+HOT_INDEX_REFRESH_SECONDS = float(os.getenv("HOT_INDEX_REFRESH_SECONDS", "300"))
+# Refreshes in between only fetch vectors of new or payload-changed points; a re-embed that
+# keeps payloads is picked up by the next full reload (or right away via mark_stale)
+HOT_INDEX_FULL_REFRESH_SECONDS = float(os.getenv("HOT_INDEX_FULL_REFRESH_SECONDS", "3600"))
+# Searches fall back to Qdrant when the last successful refresh is older than this
+HOT_INDEX_MAX_AGE_SECONDS = float(os.getenv("HOT_INDEX_MAX_AGE_SECONDS", "900"))
+HOT_INDEX_SCROLL_BATCH = int(os.getenv("HOT_INDEX_SCROLL_BATCH", "1000"))
+HOT_INDEX_HNSW_M = int(os.getenv("HOT_INDEX_HNSW_M", "16"))
+HOT_INDEX_HNSW_EF = int(os.getenv("HOT_INDEX_HNSW_EF", "128"))
+
+hits = counter("hot_index_hits_total")
+misses = counter("hot_index_misses_total")
+refreshes = counter("hot_index_refreshes_total")
+refresh_failures = counter("hot_index_refresh_failures_total")
+points = gauge("hot_index_points")
+search_seconds = histogram("hot_index_search_seconds", (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+class IndexState(NamedTuple):
+    ids: List[Any]
+    payloads: List[Optional[Dict[str, Any]]]
+    vectors: np.ndarray  # float32, rows L2-normalised for cosine collections
+    hnsw: Optional[Any]
+    loaded_at: float
+
+class HotVectorIndex:
+    """
+    In-memory copy of a (small) Qdrant collection that answers searches locally. The flat mode
+    is an exact matmul over a NumPy matrix; the HNSW mode is approximate. A full refresh
+    downloads every vector; an incremental one re-reads ids and payloads and only downloads
+    vectors for new or payload-changed points. Either way the new state is swapped in
+    atomically. search returns None whenever Qdrant should answer instead.
+    """
+
+    def __init__(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str,
+        mode: str = HOT_INDEX_MODE,
+        max_points: int = HOT_INDEX_MAX_POINTS,
+        max_age_seconds: float = HOT_INDEX_MAX_AGE_SECONDS
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.mode = mode
+        self.max_points = max_points
+        self.max_age_seconds = max_age_seconds
+        self.distance: Optional[Distance] = None
+        self._state: Optional[IndexState] = None
+        self._stale = False
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._pending_refresh: Optional[asyncio.Task] = None
+        self._last_full = 0.0
+        if mode == "hnsw" and hnswlib is None:
+            logger.warning("HOT_INDEX_MODE=hnsw but hnswlib is not installed; using the flat index")
+            self.mode = "flat"
+
+    @property
+    def ready(self) -> bool:
+        state = self._state
+        return (
+            state is not None
+            and not self._stale
+            and time.monotonic() - state.loaded_at <= self.max_age_seconds
+        )
+
+    def mark_stale(self) -> None:
+        """Stop serving until a full reload, e.g. after the collection was re-indexed"""
+        self._stale = True
+        if self._task is not None and not self._task.done():
+            self._pending_refresh = asyncio.get_running_loop().create_task(self._safe_refresh(full=True))
+
+    async def refresh(self, full: bool = False) -> bool:
+        """Bring the index up to date with the collection; returns False if it can't serve it"""
+        async with self._refresh_lock:
+            start = time.perf_counter()
+            info = await self.client.get_collection(self.collection_name)
+            vector_params = info.config.params.vectors
+            if isinstance(vector_params, dict) or vector_params.distance not in (Distance.COSINE, Distance.DOT):
+                logger.warning(f"Hot index only supports a single cosine/dot vector; leaving {self.collection_name} to Qdrant")
+                self._state = None
+                return False
+            count = (await self.client.count(self.collection_name, exact=True)).count
+            if count > self.max_points:
+                logger.warning(f"{self.collection_name} has {count} points (> {self.max_points}); leaving it to Qdrant")
+                self._state = None
+                return False
+            self.distance = vector_params.distance
+
+            old = self._state
+            # A changed dimension means the collection was re-embedded
+            full = full or old is None or old.vectors.shape[1:] != (vector_params.size,)
+
+            # Payloads are small next to vectors, so an incremental refresh re-reads them all and diffs
+            records = []
+            offset = None
+            while True:
+                page, offset = await self.client.scroll(
+                    self.collection_name, limit=HOT_INDEX_SCROLL_BATCH, offset=offset,
+                    with_payload=True, with_vectors=full
+                )
+                records.extend(page)
+                if offset is None:
+                    break
+
+            if full:
+                changed = [record.id for record in records]
+                fetched = {record.id: record.vector for record in records}
+                records_to_fetch = []
+            else:
+                old_rows = {point_id: row for row, point_id in enumerate(old.ids)}
+                changed = [
+                    record.id for record in records
+                    if record.id not in old_rows or old.payloads[old_rows[record.id]] != record.payload
+                ]
+                fetched = {}
+                records_to_fetch = changed
+            for i in range(0, len(records_to_fetch), HOT_INDEX_SCROLL_BATCH):
+                for record in await self.client.retrieve(
+                    self.collection_name, ids=records_to_fetch[i:i + HOT_INDEX_SCROLL_BATCH],
+                    with_payload=False, with_vectors=True
+                ):
+                    fetched[record.id] = record.vector
+
+            ids = [record.id for record in records]
+            payloads = [record.payload for record in records]
+            rows = [
+                np.asarray(fetched[point_id], dtype=np.float32) if point_id in fetched else old.vectors[old_rows[point_id]]
+                for point_id in ids
+            ]
+            state = await asyncio.to_thread(self._build, ids, payloads, rows)
+            self._state = state
+            self._stale = False
+            if full:
+                self._last_full = time.monotonic()
+            refreshes.inc()
+            points.set(len(ids))
+            logger.info(
+                f"Hot index {'reloaded' if full else 'refreshed'}: {len(ids)} points, {len(changed)} vectors "
+                f"downloaded in {time.perf_counter() - start:.2f}s ({self.mode})"
+            )
+            return True
+
+    def _build(self, ids, payloads, rows) -> IndexState:
+        vectors = np.vstack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+        if self.distance == Distance.COSINE and len(vectors):
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        hnsw = None
+        if self.mode == "hnsw" and len(vectors):
+            hnsw = hnswlib.Index(space="ip", dim=vectors.shape[1])
+            hnsw.init_index(max_elements=len(vectors), ef_construction=200, M=HOT_INDEX_HNSW_M)
+            hnsw.add_items(vectors, np.arange(len(vectors)))
+            hnsw.set_ef(HOT_INDEX_HNSW_EF)
+        return IndexState(ids, payloads, vectors, hnsw, time.monotonic())
+
+    def _search(self, state: IndexState, queries: np.ndarray, limit: int) -> List[List[ScoredPoint]]:
+        if self.distance == Distance.COSINE:
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        if state.hnsw is not None:
+            labels, distances = state.hnsw.knn_query(queries, k=limit)
+            # hnswlib's "ip" distance is 1 - dot product
+            top, scores = labels, 1 - distances
+        else:
+            all_scores = queries @ state.vectors.T
+            part = np.argpartition(-all_scores, limit - 1, axis=1)[:, :limit]
+            part_scores = np.take_along_axis(all_scores, part, axis=1)
+            order = np.argsort(-part_scores, axis=1)
+            top, scores = np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+        return [
+            [
+                ScoredPoint(id=state.ids[row], version=0, score=float(score), payload=state.payloads[row])
+                for row, score in zip(row_ids, row_scores)
+            ]
+            for row_ids, row_scores in zip(top, scores)
+        ]
+
+    async def search(self, em_queries: List[List[float]], limit: int) -> Optional[List[List[ScoredPoint]]]:
+        state = self._state
+        if not self.ready or limit > len(state.ids):
+            misses.inc()
+            return None
+        start = time.perf_counter()
+        queries = np.asarray(em_queries, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != state.vectors.shape[1]:
+            misses.inc()
+            return None
+        results = await asyncio.to_thread(self._search, state, queries, limit)
+        search_seconds.observe(time.perf_counter() - start)
+        hits.inc()
+        return results
+
+    async def _safe_refresh(self, full: bool = False) -> None:
+        try:
+            await self.refresh(full)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            refresh_failures.inc()
+            logger.error(f"Hot index refresh failed, searching Qdrant until it succeeds: {str(e)}")
+
+    async def start(self) -> None:
+        await self._safe_refresh(full=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._pending_refresh):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._pending_refresh = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(HOT_INDEX_REFRESH_SECONDS)
+            await self._safe_refresh(full=time.monotonic() - self._last_full >= HOT_INDEX_FULL_REFRESH_SECONDS)
@@ -0,0 +1,390 @@
+#jobs.py
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID, uuid4, uuid5
+
+from asyncpg import Record
+
+from app.core.database import get_connection, get_read_connection
+from app.core.logger import logger
+from app.core.metrics import counter, gauge, histogram
+from app.core.models import (
+    BaseResponseDTO, JobDTO, JobKind, JobStatus, Options, RFxResponseDTO, RFxType
+)
+from app.core.utils.batching_scheduler import embed_query, search_query
+from app.core.utils.persist_helpers import create_conversation
+from app.core.utils.qdrant_helpers import chunked_batch_search_documents
+from app.core.utils.rate_limiter import bulk_priority
+from app.core.utils.response_helpers import (
+    FILE_SEARCH_LIMIT, MULTIPLE_QUERIES_CONCURRENCY, SEARCH_LIMIT, answer_file_question,
+    answer_messages, answer_question_for_deck, batch_embed, combined_slide_deck, save_answers_file
+)
+from app.core.utils.write_behind import persist_messages
+
+# Jobs processed at once by this process; 0 disables the runner (e.g. API-only replicas)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Questions answered at once within one job
+JOB_QUESTION_CONCURRENCY = int(os.getenv("JOB_QUESTION_CONCURRENCY", str(MULTIPLE_QUERIES_CONCURRENCY)))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+# A running job without a heartbeat for this long lost its worker and is resumed elsewhere
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Delay before a job with failed questions is picked up again to retry them
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "30"))
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "1"))
+
+JOB_COLUMNS = "id, kind, status, conversation_id, done, total, result, error, created_on, updated_on"
+FINISHED = {JobStatus.succeeded, JobStatus.failed}
+
+submitted = counter("jobs_submitted_total")
+succeeded = counter("jobs_succeeded_total")
+failed = counter("jobs_failed_total")
+resumed = counter("jobs_resumed_total")
+retried = counter("jobs_retried_total")
+failed_questions = counter("job_failed_questions_total")
+running_jobs = gauge("jobs_running")
+job_seconds = histogram("job_seconds", (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+async def submit_job(
+    kind: JobKind,
+    questions: List[str],
+    params: Dict[str, Any],
+    conversation_id: UUID,
+    conversation_title: Optional[str] = None
+) -> UUID:
+    """
+    Store a job and one item per question, creating its conversation when a title is given.
+    params must be JSON-serialisable; it holds options, rf_type, limit, fallback and file settings.
+    """
+    job_id = uuid4()
+    async with get_connection() as conn:
+        try:
+            if conversation_title is not None:
+                await create_conversation(conn=conn, conversation_id=conversation_id, title=conversation_title)
+            await conn.execute(
+                '''
+                INSERT INTO jobs (id, kind, conversation_id, params, total)
+                VALUES ($1, $2, $3, $4::jsonb, $5);
+                ''',
+                job_id, kind.value, conversation_id, json.dumps(params), len(questions)
+            )
+            await conn.executemany(
+                'INSERT INTO job_items (job_id, idx, question) VALUES ($1, $2, $3);',
+                [(job_id, i, question) for i, question in enumerate(questions)]
+            )
+        except Exception as e:
+            logger.error(f"Error submitting {kind.value} job: {str(e)}")
+            raise
+
+    submitted.inc()
+    job_runner.notify()
+    logger.info(f"Submitted {kind.value} job {job_id} with {len(questions)} questions")
+    return job_id
+
+def _to_job(row: Record) -> JobDTO:
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return JobDTO(**job)
+
+async def get_job(job_id: UUID) -> Optional[JobDTO]:
+    # Primary, so a job is visible the moment submit returns
+    async with get_read_connection(replica=False) as conn:
+        row = await conn.fetchrow(f'SELECT {JOB_COLUMNS} FROM jobs WHERE id = $1;', job_id)
+    return _to_job(row) if row else None
+
+async def watch_job(job_id: UUID) -> AsyncIterator[JobDTO]:
+    """Yield the job whenever its status or progress changes, until it finishes"""
+    last = None
+    while True:
+        job = await get_job(job_id)
+        if job is None:
+            return
+        if (job.status, job.done) != last:
+            last = (job.status, job.done)
+            yield job
+        if job.status in FINISHED:
+            return
+        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+
+async def _claim_job(worker_id: str) -> Optional[Record]:
+    """Take the oldest queued job, or a running one whose worker stopped heartbeating"""
+    async with get_connection() as conn:
+        await conn.execute(
+            '''
+            UPDATE jobs SET status = 'failed', error = 'Too many attempts', updated_on = now()
+            WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => $1)
+              AND attempts >= $2;
+            ''',
+            JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS
+        )
+        return await conn.fetchrow(
+            '''
+            UPDATE jobs SET status = 'running', locked_by = $1, heartbeat_at = now(),
+                            attempts = attempts + 1, updated_on = now()
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE (status = 'queued' AND (run_after IS NULL OR run_after <= now()))
+                   OR (status = 'running' AND heartbeat_at < now() - make_interval(secs => $2))
+                ORDER BY created_on
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, conversation_id, params, total, done, attempts;
+            ''',
+            worker_id, JOB_STALE_SECONDS
+        )
+
+async def _record_answer(job_id: UUID, idx: int, answer: Any, failed: bool = False) -> None:
+    """
+    Store one question's answer; progress only counts a question once it succeeds. A failed
+    answer is an error placeholder that the next attempt replaces.
+    """
+    async with get_connection() as conn:
+        await conn.execute(
+            '''
+            WITH item AS (
+                UPDATE job_items SET answer = $3::jsonb, failed = $4
+                WHERE job_id = $1 AND idx = $2 AND (answer IS NULL OR failed)
+                RETURNING failed
+            )
+            UPDATE jobs SET done = done + (SELECT count(*) FROM item WHERE NOT failed), updated_on = now()
+            WHERE id = $1;
+            ''',
+            job_id, idx, json.dumps(answer), failed
+        )
+
+class RetryJob(Exception):
+    """Some questions failed and the job has attempts left; it is re-queued to retry them"""
+
+async def _finish_job(job_id: UUID, worker_id: str, status: JobStatus,
+                      result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    async with get_connection() as conn:
+        await conn.execute(
+            '''
+            UPDATE jobs SET status = $3, result = $4::jsonb, error = $5,
+                            locked_by = NULL, updated_on = now()
+            WHERE id = $1 AND locked_by = $2;
+            ''',
+            job_id, worker_id, status.value, json.dumps(result) if result is not None else None, error
+        )
+
+async def _requeue_job(job_id: UUID, worker_id: str, delay: float) -> None:
+    async with get_connection() as conn:
+        await conn.execute(
+            '''
+            UPDATE jobs SET status = 'queued', locked_by = NULL,
+                            run_after = now() + make_interval(secs => $3), updated_on = now()
+            WHERE id = $1 AND locked_by = $2;
+            ''',
+            job_id, worker_id, delay
+        )
+
+async def _fetch_items(job_id: UUID, pending_only: bool) -> List[Record]:
+    async with get_read_connection(replica=False) as conn:
+        return await conn.fetch(
+            'SELECT idx, question, answer, failed FROM job_items WHERE job_id = $1'
+            + (' AND (answer IS NULL OR failed)' if pending_only else '')
+            + ' ORDER BY idx;',
+            job_id
+        )
+
+async def _run_job(job: Record) -> dict:
+    """
+    Answer the job's unanswered and previously failed questions, then build its deck or file
+    from all answers. Raises RetryJob while questions fail and attempts are left.
+    """
+    job_id, conversation_id = job["id"], job["conversation_id"]
+    kind = JobKind(job["kind"])
+    params = json.loads(job["params"])
+    options = Options(**params["options"])
+    rf_type = RFxType(params["rf_type"])
+
+    pending = await _fetch_items(job_id, pending_only=True)
+    questions = [item["question"] for item in pending]
+    # Same context as the direct /multiple-questions and file endpoints
+    search_limit = SEARCH_LIMIT if kind == JobKind.multiple_questions else FILE_SEARCH_LIMIT
+
+    em_queries = [None] * len(questions)
+    doc_sets = [None] * len(questions)
+    try:
+        em_queries = await batch_embed(questions) if questions else []
+        doc_sets = await chunked_batch_search_documents(em_queries, limit=search_limit) if questions else []
+    except Exception as e:
+        logger.error(f"Batch embedding/search failed for job {job_id}, processing questions individually: {str(e)}")
+
+    semaphore = asyncio.Semaphore(max(1, JOB_QUESTION_CONCURRENCY))
+
+    async def answer(item, em_query, doc_set):
+        if kind == JobKind.multiple_questions:
+            response, ok = await answer_question_for_deck(
+                item["question"], rf_type.value, options, conversation_id,
+                params["limit"], params["fallback"], semaphore, em_query, doc_set
+            )
+            if ok:
+                messages = answer_messages(conversation_id, response.results)
+                # Saved before the item counts as answered; ids derive from the item, so
+                # re-answering it after a crash in between doesn't add the messages twice
+                for i, msg in enumerate(messages):
+                    msg.id = uuid5(job_id, f"{item['idx']}:{i}")
+                await persist_messages(messages)
+            await _record_answer(job_id, item["idx"], response.model_dump(mode="json"), failed=not ok)
+            return ok
+
+        async with semaphore:
+            try:
+                if em_query is None:
+                    em_query = await embed_query(item["question"])
+                    doc_set = await search_query(em_query, limit=search_limit)
+                answers = await answer_file_question(item["question"], options, rf_type, em_query, doc_set)
+                ok = True
+            except Exception as e:
+                logger.exception(f"Error answering question {item['idx']} of job {job_id}: {str(e)}")
+                answers = [BaseResponseDTO(text="An error occurred while answering this question.", sender="assistant", referenceLinks=[])]
+                ok = False
+        await _record_answer(job_id, item["idx"], [a.model_dump(mode="json") for a in answers], failed=not ok)
+        return ok
+
+    results = await asyncio.gather(*[
+        answer(item, em_query, doc_set)
+        for item, em_query, doc_set in zip(pending, em_queries, doc_sets)
+    ])
+    failures = results.count(False)
+    if failures:
+        failed_questions.inc(failures)
+        if job["attempts"] < JOB_MAX_ATTEMPTS:
+            raise RetryJob(f"{failures} of {len(pending)} questions failed")
+        logger.error(f"Job {job_id} finishing with {failures} failed questions after {job['attempts']} attempts")
+
+    items = await _fetch_items(job_id, pending_only=False)
+    failed_count = sum(1 for item in items if item["failed"])
+    if kind == JobKind.multiple_questions:
+        answers = [RFxResponseDTO.model_validate(json.loads(item["answer"])) for item in items]
+        return {
+            "slide_deck": await combined_slide_deck(answers),
+            "answers": [answer.model_dump(mode="json") for answer in answers],
+            "failed": failed_count
+        }
+
+    all_answers = [
+        [BaseResponseDTO.model_validate(a) for a in json.loads(item["answer"])]
+        for item in items
+    ]
+    response = await save_answers_file(
+        [item["question"] for item in items], all_answers,
+        params["out_file"], params["file_name"], conversation_id
+    )
+    return {"file_url": response.file_links[0], "message": response.text, "failed": failed_count}
+
+class JobRunner:
+    """
+    Runs up to `workers` jobs at once from the jobs table. Progress is recorded per question,
+    so a job picked up again after a restart only answers what is still missing, plus the
+    questions that failed last time.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand unfinished jobs back right away instead of waiting for them to go stale
+        async with get_connection() as conn:
+            await conn.execute(
+                '''
+                UPDATE jobs SET status = 'queued', locked_by = NULL, updated_on = now()
+                WHERE locked_by = $1 AND status = 'running';
+                ''',
+                self.worker_id
+            )
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await _claim_job(self.worker_id)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def _heartbeat(self, job_id: UUID) -> None:
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                async with get_connection() as conn:
+                    await conn.execute(
+                        'UPDATE jobs SET heartbeat_at = now() WHERE id = $1 AND locked_by = $2;',
+                        job_id, self.worker_id
+                    )
+            except Exception as e:
+                logger.error(f"Error sending heartbeat for job {job_id}: {str(e)}")
+
+    async def _process(self, job: Record) -> None:
+        job_id = job["id"]
+        if job["attempts"] > 1:
+            resumed.inc()
+            logger.info(f"Resuming job {job_id} at {job['done']}/{job['total']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        running_jobs.inc()
+        start = time.perf_counter()
+        try:
+            # Jobs are background work; interactive requests go first at the provider
+            with bulk_priority():
+                result = await _run_job(job)
+            await _finish_job(job_id, self.worker_id, JobStatus.succeeded, result=result)
+            succeeded.inc()
+            logger.info(f"Job {job_id} finished in {time.perf_counter() - start:.2f}s")
+        except asyncio.CancelledError:
+            raise
+        except RetryJob as e:
+            retried.inc()
+            logger.warning(f"Job {job_id}: {str(e)}, retrying in {JOB_RETRY_SECONDS}s (attempt {job['attempts']}/{JOB_MAX_ATTEMPTS})")
+            try:
+                await _requeue_job(job_id, self.worker_id, JOB_RETRY_SECONDS)
+            except Exception as requeue_error:
+                # Left running; it is resumed once its heartbeat goes stale
+                logger.error(f"Error re-queueing job {job_id}: {str(requeue_error)}")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {str(e)}")
+            failed.inc()
+            try:
+                await _finish_job(job_id, self.worker_id, JobStatus.failed, error=str(e))
+            except Exception as finish_error:
+                logger.error(f"Error marking job {job_id} failed: {str(finish_error)}")
+        finally:
+            heartbeat.cancel()
+            running_jobs.dec()
+            job_seconds.observe(time.perf_counter() - start)
+
+job_runner = JobRunner()
+
+# Called from the app lifespan next to create_pool/close_pool
+async def start_job_runner() -> None:
+    if JOB_WORKERS > 0:
+        await job_runner.start()
+
+async def stop_job_runner() -> None:
+    await job_runner.stop()
@@ -0,0 +1,43 @@
+#lifespan.py
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from app.core.database import close_pool, create_pool
+from app.core.logger import logger
+from app.core.utils.embedding_cache import stop_embedding_cache_prune
+from app.core.utils.jobs import start_job_runner, stop_job_runner
+from app.core.utils.pptx_helpers import (
+    close_http_session, start_slide_fragment_warmup, stop_slide_fragment_warmup
+)
+from app.core.utils.qdrant_helpers import start_hot_index, stop_hot_index
+from app.core.utils.worker_pool import pptx_pool
+from app.core.utils.write_behind import start_write_behind, stop_write_behind
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup and shutdown of the process-wide resources; pass as FastAPI(lifespan=lifespan).
+    Shutdown runs in reverse order of startup.
+    """
+    await create_pool()
+    await start_write_behind()
+    await start_job_runner()
+    await start_hot_index()
+    await start_slide_fragment_warmup()
+    logger.info("Application resources started")
+    try:
+        yield
+    finally:
+        await stop_slide_fragment_warmup()
+        await stop_hot_index()
+        # Hands unfinished jobs back to the queue, so it needs the pool
+        await stop_job_runner()
+        await close_http_session()
+        await asyncio.to_thread(pptx_pool.shutdown)
+        # Drains queued messages into Postgres, so it goes before the pool closes
+        await stop_write_behind()
+        await stop_embedding_cache_prune()
+        await close_pool()
+        logger.info("Application resources stopped")
@@ -0,0 +1,91 @@
+#metrics.py
+import bisect
+from typing import Dict, List, Tuple, Union
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Counter:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+class Gauge:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+class Histogram:
+    def __init__(self, name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, out = 0, []
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            out.append(("+Inf" if bound == float("inf") else f"{bound:g}", total))
+        return out
+
+Metric = Union[Counter, Gauge, Histogram]
+_registry: Dict[str, Metric] = {}
+
+def _get_or_create(name: str, cls, *args) -> Metric:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = cls(name, *args)
+    elif not isinstance(metric, cls):
+        raise ValueError(f"Metric {name} is already registered as {type(metric).__name__}")
+    return metric
+
+def counter(name: str) -> Counter:
+    return _get_or_create(name, Counter)
+
+def gauge(name: str) -> Gauge:
+    return _get_or_create(name, Gauge)
+
+def histogram(name: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(name, Histogram, buckets)
+
+def snapshot() -> Dict[str, dict]:
+    """Return the current value of every registered metric"""
+    out = {}
+    for name, metric in _registry.items():
+        if isinstance(metric, Histogram):
+            out[name] = {"count": metric.count, "sum": metric.sum, "buckets": dict(metric.cumulative())}
+        else:
+            out[name] = {"value": metric.value}
+    return out
+
+def render_prometheus() -> str:
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        if isinstance(metric, Histogram):
+            lines.append(f"# TYPE {name} histogram")
+            lines.extend(f'{name}_bucket{{le="{le}"}} {n}' for le, n in metric.cumulative())
+            lines.append(f"{name}_sum {metric.sum}")
+            lines.append(f"{name}_count {metric.count}")
+        else:
+            lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'gauge'}")
+            lines.append(f"{name} {metric.value}")
+    return "\n".join(lines) + "\n"
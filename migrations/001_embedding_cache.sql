@@ -0,0 +1,9 @@
+-- Persistent tier of the embedding cache (see embedding_cache.py)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key        TEXT PRIMARY KEY,
+    model      TEXT NOT NULL,
+    embedding  REAL[] NOT NULL,
+    created_on TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS embedding_cache_created_on_idx ON embedding_cache (created_on);
@@ -0,0 +1,8 @@
+-- Supports keyset pagination on (created_on, id) in fetch_conversations_page and
+-- stream_conversations. CONCURRENTLY cannot run inside a transaction block, so apply
+-- this file statement by statement (e.g. psql without --single-transaction).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS conversations_user_id_created_on_id_idx
+    ON conversations (user_id, created_on DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS conversations_created_on_id_idx
+    ON conversations (created_on DESC, id DESC);
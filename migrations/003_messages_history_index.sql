@@ -0,0 +1,7 @@
+-- Supports "last N messages" reads and reference aggregation in conversation_history.py.
+-- CONCURRENTLY cannot run inside a transaction block; apply statement by statement.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS messages_conversation_id_timestamp_idx
+    ON messages (conversation_id, timestamp DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS reference_links_message_id_idx
+    ON reference_links (message_id);
@@ -0,0 +1,30 @@
+-- Background jobs and their per-question progress (see jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id              UUID PRIMARY KEY,
+    kind            TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'queued',
+    conversation_id UUID NOT NULL,
+    params          JSONB NOT NULL,
+    total           INTEGER NOT NULL,
+    done            INTEGER NOT NULL DEFAULT 0,
+    result          JSONB,
+    error           TEXT,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    locked_by       TEXT,
+    heartbeat_at    TIMESTAMP,
+    created_on      TIMESTAMP NOT NULL DEFAULT now(),
+    updated_on      TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Only unfinished jobs are ever scanned by workers claiming work
+CREATE INDEX IF NOT EXISTS jobs_unfinished_idx
+    ON jobs (created_on) WHERE status IN ('queued', 'running');
+
+-- answer stays NULL until the question is done, which is what a resumed job skips on
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id   UUID NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    idx      INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer   JSONB,
+    PRIMARY KEY (job_id, idx)
+);
@@ -0,0 +1,6 @@
+-- A failed question keeps its error placeholder as the answer but is answered again
+-- when the job is retried (see jobs.py)
+ALTER TABLE job_items ADD COLUMN IF NOT EXISTS failed BOOLEAN NOT NULL DEFAULT false;
+
+-- A job re-queued to retry failed questions isn't claimed again before this
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS run_after TIMESTAMP;
@@ -1,6 +1,6 @@
 from enum import Enum
-from uuid import UUID
-from pydantic import BaseModel, field_validator
+from uuid import UUID, uuid4
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Union
 from datetime import datetime
 from app.core.utils.shared.constants import DEFAULT_CONFIG
@@ -119,6 +119,59 @@ class ConversationsDTO(BaseModel):
     title: Optional[str] = None
     summary: Optional[str] = None
 
+class ConversationsPageDTO(BaseModel):
+    items: List[ConversationsDTO]
+    next_cursor: Optional[str] = None  # Pass back as cursor to get the next page
+
 class TranslatedFileResponse(BaseModel):  # Added TranslatedFileResponse class
     result: str  # Path or URL to the saved translated file
-]
+
+class UploadResult(BaseModel):
+    url: str
+    blob_name: str
+    sha256: str
+    size: int
+    skipped: bool  # True when identical content was already stored
+    seconds: float
+
+class PendingMessage(BaseModel):
+    """A message and its references waiting to be written with persist_helpers.add_messages"""
+    id: UUID = Field(default_factory=uuid4)
+    text: str
+    doc_references: List[DocReference] = []
+    msg_type: MessageType
+    conversation_id: UUID
+    file_links: Optional[List[str]] = None
+    sender: str = "user"
+    timestamp: datetime = Field(default_factory=datetime.now)
+
+class QuestionAnswerEvent(BaseModel):
+    """One answered question of a streamed /multiple-questions request"""
+    index: int  # Position of the question in the request
+    question: str
+    answer: RFxResponseDTO
+
+class SlideDeckEvent(BaseModel):
+    slide_deck: str  # Empty when no slides were referenced or the merge failed
+
+class JobKind(Enum):
+    multiple_questions = "multiple_questions"
+    file = "file"
+
+class JobStatus(Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+class JobDTO(BaseModel):
+    id: UUID
+    kind: JobKind
+    status: JobStatus
+    conversation_id: UUID
+    done: int  # Questions answered so far
+    total: int
+    result: Optional[dict] = None  # slide_deck and answers, or the answered file's URL
+    error: Optional[str] = None
+    created_on: datetime
+    updated_on: datetime
@@ -1,21 +1,74 @@
 #persist_helpers.py
 import os
-from datetime import datetime
-from typing import List, Optional
-from uuid import UUID, uuid4
+import base64
+import hashlib
+import mimetypes
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+from uuid import UUID, uuid5
 from asyncpg import Record
 from contextlib import _AsyncGeneratorContextManager
 from io import BytesIO
 
-from app.core.database import get_connection, blob_service_client
-from app.core.models import DocReference, MessageType
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobSasPermissions, ContentSettings, generate_blob_sas
+
+from app.core.database import (
+    account_key, get_connection, get_read_connection, register_statement, blob_service_client
+)
+from app.core.models import DocReference, MessageType, PendingMessage, UploadResult
 from app.core.logger import logger
+from app.core.metrics import counter, histogram
+from app.core.utils.conversation_history import invalidate_history
+
+# Store uploads under their content hash and skip re-uploading identical bytes
+UPLOAD_CONTENT_ADDRESSED = os.getenv("UPLOAD_CONTENT_ADDRESSED", "true").lower() == "true"
+# Block and single-put sizes are set on blob_service_client (UPLOAD_BLOCK_SIZE, UPLOAD_SINGLE_PUT_SIZE)
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+# Lifetime of the read-only SAS links handed out for content-addressed uploads
+UPLOAD_LINK_EXPIRY_DAYS = int(os.getenv("UPLOAD_LINK_EXPIRY_DAYS", "365"))
+
+# Only the columns ConversationsDTO needs
+CONVERSATION_COLUMNS = "id, user_id, created_on, title, summary"
+CONVERSATIONS_PAGE_MAX = 200
+# Rows fetched per server-side cursor round-trip when exporting
+CONVERSATIONS_EXPORT_PREFETCH = int(os.getenv("CONVERSATIONS_EXPORT_PREFETCH", "1000"))
+
+INSERT_MESSAGE_SQL = """
+INSERT INTO messages (id, text, conversation_id, msg_type, 
+                      file_links, sender, timestamp)
+VALUES ($1, $2, $3, $4, $5, $6, $7)
+"""
+INSERT_REFERENCE_SQL = """
+INSERT INTO reference_links(id, doc_id, label, url,
+                            image_url, message_id, slide)
+VALUES($1, $2, $3, $4, $5, $6, $7)
+"""
+CONVERSATIONS_PAGE_SQL = f"""
+SELECT {CONVERSATION_COLUMNS} FROM conversations
+WHERE user_id = $1 {{keyset}}
+ORDER BY created_on DESC, id DESC
+LIMIT ${{limit}};
+"""
+
+# Hot queries, run as named prepared statements
+register_statement("insert_message", INSERT_MESSAGE_SQL)
+register_statement("insert_message_skip_existing", INSERT_MESSAGE_SQL + "ON CONFLICT (id) DO NOTHING")
+register_statement("insert_reference", INSERT_REFERENCE_SQL)
+register_statement("insert_reference_skip_existing", INSERT_REFERENCE_SQL + "ON CONFLICT (id) DO NOTHING")
+register_statement("conversations_page_first", CONVERSATIONS_PAGE_SQL.format(keyset="", limit=2))
+register_statement("conversations_page_after", CONVERSATIONS_PAGE_SQL.format(keyset="AND (created_on, id) < ($2, $3)", limit=4))
+
+uploaded_bytes = counter("upload_bytes_total")
+skipped_bytes = counter("upload_skipped_bytes_total")
+upload_seconds = histogram("upload_seconds")
 
 async def fetch_messages(conversation_id: UUID) -> List[Record]:
     """
     Fetch messages from the database for a given conversation ID.
     """
-    async with get_connection() as conn:
+    async with get_read_connection() as conn:
         logger.info(f"Fetching messages with conversation ID {conversation_id}")
         try:
             query = 'SELECT * FROM messages WHERE conversation_id = $1;'
@@ -30,7 +83,7 @@ async def fetch_messages_with_refs(conversation_id: UUID) -> List[Record]:
     """
     Fetch messages and their associated reference links for a given conversation ID.
     """
-    async with get_connection() as conn:
+    async with get_read_connection() as conn:
         try:
             query = '''
             SELECT M.id, M.text, M.file_links, M.conversation_id,
@@ -47,6 +100,45 @@ async def fetch_messages_with_refs(conversation_id: UUID) -> List[Record]:
             logger.exception(f"Error fetching messages with refs: {str(e)}")
             raise
 
+async def add_messages(messages: List[PendingMessage], skip_existing: bool = False) -> List[UUID]:
+    """
+    Insert messages and all of their reference links in a single transaction,
+    using one executemany per table instead of one statement per row.
+    With skip_existing, rows that were already written are ignored so a batch can be replayed.
+    """
+    if not messages:
+        return []
+    suffix = "_skip_existing" if skip_existing else ""
+    async with get_connection() as conn:
+        try:
+            insert_message = await conn.prepared("insert_message" + suffix)
+            await insert_message.executemany(
+                [
+                    (msg.id, msg.text, msg.conversation_id, msg.msg_type.value,
+                     msg.file_links or [], msg.sender, msg.timestamp)
+                    for msg in messages
+                ]
+            )
+
+            # Reference ids derive from the message id so replays produce the same rows
+            references = [
+                (uuid5(msg.id, str(i)), doc_ref.id, doc_ref.label, doc_ref.url, doc_ref.image_url, msg.id, doc_ref.slide)
+                for msg in messages
+                for i, doc_ref in enumerate(msg.doc_references)
+            ]
+            if references:
+                insert_reference = await conn.prepared("insert_reference" + suffix)
+                await insert_reference.executemany(references)
+
+            logger.info(f"Added {len(messages)} messages with {len(references)} references")
+        except Exception as e:
+            logger.error(f"Error adding messages: {str(e)}")
+            raise
+
+    # After commit, so a concurrent read can't re-cache the pre-insert history
+    invalidate_history(msg.conversation_id for msg in messages)
+    return [msg.id for msg in messages]
+
 async def add_message(
     msg_text: str,
     doc_references: List[DocReference],
@@ -58,53 +150,25 @@ async def add_message(
     """
     Insert a new message into the database, attaching any provided file links and references.
     """
-    async with get_connection() as conn:
-        try:
-            message_id = uuid4()
-            await conn.execute(
-                """
-                INSERT INTO messages (id, text, conversation_id, msg_type, 
-                                      file_links, sender, timestamp)
-                VALUES ($1, $2, $3, $4, $5, $6, $7)
-                """,
-                message_id,
-                msg_text,
-                conversation_id,
-                msg_type.value,
-                file_links or [],
-                sender,
-                datetime.now()
-            )
-
-            for doc_ref in doc_references:
-                await conn.execute(
-                    '''
-                    INSERT INTO reference_links(id, doc_id, label, url,
-                                                image_url, message_id, slide)
-                    VALUES($1, $2, $3, $4, $5, $6, $7);
-                    ''',
-                    uuid4(),
-                    doc_ref.id,
-                    doc_ref.label,
-                    doc_ref.url,
-                    doc_ref.image_url,
-                    message_id,
-                    doc_ref.slide
-                )
-            
-            logger.info(f"Added message {message_id} to conversation {conversation_id}")
-            return message_id
-        except Exception as e:
-            logger.error(f"Error adding message: {str(e)}")
-            raise
+    message_ids = await add_messages([PendingMessage(
+        text=msg_text,
+        doc_references=doc_references or [],
+        msg_type=msg_type,
+        conversation_id=conversation_id,
+        file_links=file_links,
+        sender=sender
+    )])
+    logger.info(f"Added message {message_ids[0]} to conversation {conversation_id}")
+    return message_ids[0]
 
 async def fetch_all_conversations() -> List[Record]:
     """
     Retrieve all conversations from the database in descending order of creation date.
+    Prefer fetch_conversations_page or stream_conversations for large tables.
     """
-    async with get_connection() as conn:
+    async with get_read_connection() as conn:
         try:
-            query = 'SELECT * FROM conversations ORDER BY created_on DESC;'
+            query = f'SELECT {CONVERSATION_COLUMNS} FROM conversations ORDER BY created_on DESC;'
             conversations = await conn.fetch(query)
             logger.info(f"Fetched {len(conversations)} conversations")
             return conversations
@@ -112,6 +176,64 @@ async def fetch_all_conversations() -> List[Record]:
             logger.error(f"Error fetching conversations: {str(e)}")
             raise
 
+def encode_conversation_cursor(created_on: datetime, conversation_id: UUID) -> str:
+    return base64.urlsafe_b64encode(f"{created_on.isoformat()}|{conversation_id}".encode()).decode()
+
+def decode_conversation_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_on, conversation_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_on), UUID(conversation_id)
+    except Exception:
+        raise ValueError("Invalid conversation cursor")
+
+async def fetch_conversations_page(
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None
+) -> Tuple[List[Record], Optional[str]]:
+    """
+    Fetch one page of a user's conversations, newest first, using keyset pagination on
+    (created_on, id). Returns the rows and the cursor for the next page (None on the last page).
+    """
+    limit = max(1, min(limit, CONVERSATIONS_PAGE_MAX))
+    args = [user_id]
+    statement = "conversations_page_first"
+    if cursor:
+        args.extend(decode_conversation_cursor(cursor))
+        statement = "conversations_page_after"
+    args.append(limit + 1)
+
+    async with get_read_connection() as conn:
+        try:
+            rows = await (await conn.prepared(statement)).fetch(*args)
+        except Exception as e:
+            logger.error(f"Error fetching conversations page: {str(e)}")
+            raise
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_conversation_cursor(rows[-1]["created_on"], rows[-1]["id"])
+    return rows, next_cursor
+
+async def stream_conversations(user_id: Optional[str] = None) -> AsyncIterator[Record]:
+    """
+    Stream conversations, newest first, through a server-side cursor so exports never
+    hold the whole table in memory.
+    """
+    query = f'SELECT {CONVERSATION_COLUMNS} FROM conversations'
+    args = []
+    if user_id is not None:
+        query += ' WHERE user_id = $1'
+        args.append(user_id)
+    query += ' ORDER BY created_on DESC, id DESC'
+
+    # asyncpg cursors need a transaction; the read pool's is read-only
+    async with get_read_connection() as conn:
+        async with conn.transaction(readonly=True):
+            async for record in conn.cursor(query, *args, prefetch=CONVERSATIONS_EXPORT_PREFETCH):
+                yield record
+
 async def create_conversation(
     conn: _AsyncGeneratorContextManager,
     conversation_id: UUID,
@@ -135,17 +257,82 @@ async def create_conversation(
         logger.error(f"Error creating conversation: {str(e)}")
         raise
 
-async def upload_file(file: BytesIO, file_name: str) -> str:
+def _content_addressed_name(sha256: str, file_name: str) -> str:
+    _, ext = os.path.splitext(file_name)
+    return f"cas/{sha256}{ext}"
+
+async def upload_file_with_stats(file: BytesIO, file_name: str) -> UploadResult:
     """
-    Upload a file to Azure Blob Storage and return the file URL.
+    Upload a file to Azure Blob Storage in parallel chunks and report its size and timing.
+    With content addressing the blob is named after the content's SHA-256 and the upload
+    is skipped when that blob already exists. The blob is then shared by every uploader, so
+    file_name is set as the download name on the returned link rather than on the blob.
     """
+    start = time.perf_counter()
     try:
-        account_name = os.getenv("STORAGE_ACCOUNT_NAME")
-        container_name = os.getenv("STORAGE_CONTAINER_NAME")
-        blob_client = blob_service_client.get_blob_client(container=container_name, blob=file_name)
-        await blob_client.upload_blob(file)
-        url = f"https://{account_name}.blob.core.windows.net/{container_name}/{file_name}"
-        return url
+        data = file.getvalue()
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob_name = _content_addressed_name(sha256, file_name) if UPLOAD_CONTENT_ADDRESSED else file_name
+        # Derived from the shared client, so uploads reuse its pooled connections
+        blob_client = blob_service_client.get_blob_client(os.getenv("STORAGE_CONTAINER_NAME"), blob_name)
+        skipped = UPLOAD_CONTENT_ADDRESSED and await blob_client.exists()
+        if not skipped:
+            await blob_client.upload_blob(
+                data,
+                overwrite=UPLOAD_CONTENT_ADDRESSED,
+                max_concurrency=UPLOAD_MAX_CONCURRENCY,
+                content_settings=ContentSettings(
+                    content_type=mimetypes.guess_type(file_name)[0],
+                    content_disposition=None if UPLOAD_CONTENT_ADDRESSED else f'attachment; filename="{file_name}"',
+                ),
+            )
+        url = _download_url(blob_client, file_name) if UPLOAD_CONTENT_ADDRESSED else blob_client.url
+
+        seconds = time.perf_counter() - start
+        (skipped_bytes if skipped else uploaded_bytes).inc(len(data))
+        upload_seconds.observe(seconds)
+        logger.info(f"{'Skipped' if skipped else 'Uploaded'} {blob_name} ({len(data)} bytes) in {seconds:.2f}s")
+        return UploadResult(url=url, blob_name=blob_name, sha256=sha256, size=len(data), skipped=skipped, seconds=seconds)
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
         raise
+
+def _download_url(blob_client, file_name: str) -> str:
+    """Blob URL with a read-only SAS whose response headers name the download file_name"""
+    sas = generate_blob_sas(
+        blob_client.account_name,
+        blob_client.container_name,
+        blob_client.blob_name,
+        account_key=account_key,
+        permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(days=UPLOAD_LINK_EXPIRY_DAYS),
+        content_disposition=f'attachment; filename="{file_name}"',
+    )
+    return f"{blob_client.url}?{sas}"
+
+def content_key(*parts: str) -> str:
+    """SHA-256 over parts, for outputs whose bytes differ run to run but whose inputs don't"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+async def find_content_addressed_blob(blob_name: str) -> Optional[str]:
+    """URL of an already-stored content-addressed blob, or None when it has to be produced"""
+    if not UPLOAD_CONTENT_ADDRESSED:
+        return None
+    blob_client = blob_service_client.get_blob_client(os.getenv("STORAGE_CONTAINER_NAME"), blob_name)
+    try:
+        properties = await blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        return None
+    skipped_bytes.inc(properties.size)
+    logger.info(f"Skipped {blob_name} ({properties.size} bytes), already stored")
+    return blob_client.url
+
+async def upload_file(file: BytesIO, file_name: str) -> str:
+    """
+    Upload a file to Azure Blob Storage and return the file URL.
+    """
+    return (await upload_file_with_stats(file, file_name)).url
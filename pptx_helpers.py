@@ -1,11 +1,28 @@
 import os
 import copy
-import requests
+import hashlib
+import time
+import asyncio
+import aiohttp
+from functools import partial
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urlparse
 from uuid import uuid4
 from io import BytesIO
 from pptx import Presentation
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotModifiedError
+from app.core.database import blob_service_client
 from app.core.logger import logger
-from app.core.utils.persist_helpers import upload_file
+from app.core.utils.slide_cache import SLIDE_CACHE_ENABLED, SlideFetch, slide_cache
+from app.core.utils.worker_pool import pptx_pool
+from app.core.utils.qdrant_helpers import list_slide_urls
+from app.core.utils.persist_helpers import UPLOAD_CONTENT_ADDRESSED, content_key, find_content_addressed_blob
+from app.core.utils.blob_stream import open_block_blob_writer
+from app.core.utils.slide_fragments import (
+    FRAGMENT_FORMAT, SLIDE_FRAGMENTS_ENABLED, IncompleteDeck, assemble_deck, extract_fragment,
+    fragment_index, to_supported_image
+)
 from pptx.shapes.picture import Picture
 from pptx.util import Inches  # Added for dimension conversion
 from pptx.enum.shapes import MSO_SHAPE_TYPE
@@ -18,29 +35,115 @@ def delete_file(file_path):
     except Exception as ex:
         logger.error(f"Error deleting {file_path}: {str(ex)}")
 
-def download_slide(url):
-    """Improved download with timeout and error handling"""
-    file_name = f"{uuid4()}.pptx"
-    try:
-        response = requests.get(url, timeout=10)
+SLIDE_DOWNLOAD_CONCURRENCY = int(os.getenv("SLIDE_DOWNLOAD_CONCURRENCY", "8"))
+SLIDE_DOWNLOAD_TIMEOUT = float(os.getenv("SLIDE_DOWNLOAD_TIMEOUT", "10"))
+SLIDE_DOWNLOAD_POOL_SIZE = int(os.getenv("SLIDE_DOWNLOAD_POOL_SIZE", "32"))
+# Index every reference slide in the background at startup (and after each invalidate)
+SLIDE_FRAGMENTS_WARM_ON_START = os.getenv("SLIDE_FRAGMENTS_WARM_ON_START", "true").lower() == "true"
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Shared session so slide downloads reuse pooled keep-alive connections"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=SLIDE_DOWNLOAD_POOL_SIZE, ttl_dns_cache=300)
+        )
+    return _http_session
+
+async def close_http_session():
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+def own_blob_location(url) -> Optional[Tuple[str, str]]:
+    """Return (container, blob) when the URL points at our own storage account"""
+    parsed = urlparse(url)
+    if not parsed.hostname or parsed.hostname.lower() != blob_service_client.primary_hostname.lower():
+        return None
+    container, _, blob = parsed.path.lstrip("/").partition("/")
+    return (container, unquote(blob)) if container and blob else None
+
+async def _fetch_slide(url, etag=None, last_modified=None) -> Optional[SlideFetch]:
+    """Fetch a deck, returning None when it is unchanged since the given etag/last_modified"""
+    if location := own_blob_location(url):
+        blob_client = blob_service_client.get_blob_client(*location)
+        try:
+            if etag:
+                downloader = await blob_client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+            else:
+                downloader = await blob_client.download_blob()
+        except ResourceNotModifiedError:
+            return None
+        return SlideFetch(await downloader.readall(), downloader.properties.etag)
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with get_http_session().get(url, headers=headers) as response:
+        if response.status == 304:
+            return None
         response.raise_for_status()
-        with open(file_name, 'wb') as file_obj:
-            file_obj.write(response.content)
-        logger.info(f"Downloaded: {file_name}")
-        return file_name
+        return SlideFetch(await response.read(), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+async def _download(url) -> bytes:
+    if SLIDE_CACHE_ENABLED:
+        return await slide_cache.get(url, _fetch_slide)
+    return (await _fetch_slide(url)).data
+
+async def download_slide(url) -> Optional[BytesIO]:
+    """Download a slide deck into memory with a per-URL timeout"""
+    try:
+        data = await asyncio.wait_for(_download(url), SLIDE_DOWNLOAD_TIMEOUT)
+        logger.info(f"Downloaded {len(data)} bytes from {url}")
+        return BytesIO(data)
     except Exception as e:
         logger.error(f"Download failed for {url}: {str(e)}")
         return None
 
-import tempfile
-from PIL import Image
+async def download_slides(urls: List[str]) -> List[Optional[BytesIO]]:
+    """Download slide decks in parallel, bounded by SLIDE_DOWNLOAD_CONCURRENCY, keeping input order"""
+    semaphore = asyncio.Semaphore(SLIDE_DOWNLOAD_CONCURRENCY)
 
-def copy_slide_from_external_prs(prs, source_file):
-    """Enhanced slide copying with image format validation, temporary file handling, and improved logging"""
+    async def bounded(url):
+        async with semaphore:
+            return await download_slide(url)
+
+    return await asyncio.gather(*[bounded(url) for url in urls])
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+def add_picture_dedup(slide, shape, image_parts):
+    """
+    Add a copy of a picture shape to slide entirely in memory. image_parts maps the source
+    image's SHA1 to the image part already in the merged package, so each image is stored once.
+    """
+    image = shape.image
+    image_part = image_parts.get(image.sha1)
+    if image_part is None:
+        image_stream = BytesIO(to_supported_image(image.blob, image.content_type))
+        image_part, rId = slide.part.get_or_add_image_part(image_stream)
+        image_parts[image.sha1] = image_part
+    else:
+        rId = slide.part.relate_to(image_part, RT.IMAGE)
+
+    # Same steps as SlideShapes.add_picture, minus re-reading and re-hashing the image
+    slide.shapes._add_pic_from_image_part(image_part, rId, shape.left, shape.top, shape.width, shape.height)
+    slide.shapes._recalculate_extents()
+
+def copy_slide_from_external_prs(prs, source_file, source_name=None, image_parts=None, strict=False):
+    """
+    Enhanced slide copying with in-memory, deduplicated image copies and improved logging.
+    Shapes that fail to copy are skipped, or raise IncompleteDeck when strict.
+    """
+    source_name = source_name or source_file
+    image_parts = {} if image_parts is None else image_parts
     try:
         external_prs = Presentation(source_file)
         for slide_number, source_slide in enumerate(external_prs.slides, start=1):
-            logger.info(f"Copying slide {slide_number} from {source_file}")
+            logger.info(f"Copying slide {slide_number} from {source_name}")
             
             slide_layout = prs.slide_layouts[6]
             new_slide = prs.slides.add_slide(slide_layout)
@@ -49,33 +152,11 @@ def copy_slide_from_external_prs(prs, source_file):
             for shape in source_slide.shapes:
                 if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
                     try:
-                        # Validate and convert image format using PIL
-                        img = Image.open(BytesIO(shape.image.blob))
-                        if img.format not in ['PNG', 'JPEG']:
-                            logger.warning(f"Unsupported image format: {img.format}. Converting to PNG.")
-                            with BytesIO() as output:
-                                img.save(output, format="PNG")
-                                image_stream = BytesIO(output.getvalue())
-                        else:
-                            image_stream = BytesIO(shape.image.blob)
-                        
-                        # Use temporary file to add picture
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{img.format.lower()}") as tmp_img:
-                            tmp_img.write(image_stream.getvalue())
-                            tmp_img_path = tmp_img.name
-                        
-                        new_slide.shapes.add_picture(
-                            tmp_img_path,
-                            shape.left,
-                            shape.top,
-                            shape.width,
-                            shape.height
-                        )
+                        add_picture_dedup(new_slide, shape, image_parts)
                         logger.info("Image copied successfully")
-                        
-                        # Remove temporary image file
-                        os.remove(tmp_img_path)
                     except Exception as img_error:
+                        if strict:
+                            raise IncompleteDeck(f"Failed to copy image from {source_name}: {str(img_error)}") from img_error
                         logger.error(f"Failed to copy image: {str(img_error)}")
                 else:
                     try:
@@ -83,64 +164,169 @@ def copy_slide_from_external_prs(prs, source_file):
                         new_slide.shapes._spTree.insert_element_before(new_element, 'p:extLst')
                         logger.info("Shape copied successfully")
                     except Exception as shape_error:
+                        if strict:
+                            raise IncompleteDeck(f"Failed to copy shape from {source_name}: {str(shape_error)}") from shape_error
                         logger.error(f"Failed to copy shape: {str(shape_error)}")
     except Exception as e:
-        logger.error(f"Slide copy failed for {source_file}: {str(e)}")
+        logger.error(f"Slide copy failed for {source_name}: {str(e)}")
+        raise
+
+
+
+PPTX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+def build_combined_deck(sources: List[Tuple[str, bytes]], output=None, strict: bool = False) -> Optional[bytes]:
+    """
+    Merge the slides of every source deck into one presentation; runs in the pptx worker pool.
+    Writes to output when given, otherwise returns the package bytes. Invalid decks are
+    skipped, or raise IncompleteDeck when strict.
+    """
+    prs = Presentation()
+    prs.slide_width = Inches(13.33)  # Standard 16:9 aspect ratio
+    prs.slide_height = Inches(7.5)
+
+    # Shared across sources so a logo used on every slide is stored once
+    image_parts = {}
+    for idx, (url, slide_data) in enumerate(sources, 1):
+        logger.info(f"Processing slide {idx}/{len(sources)}")
+        try:
+            copy_slide_from_external_prs(prs, BytesIO(slide_data), url, image_parts, strict)
+        except IncompleteDeck:
+            raise
+        except Exception as e:
+            if strict:
+                raise IncompleteDeck(f"Invalid slide {url}: {str(e)}") from e
+            logger.error(f"Skipping invalid slide {url}: {str(e)}")
+            continue
+
+    if output is not None:
+        prs.save(output)
+        return None
+    buffer = BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+def build_deck_to_blob(build, payload, container: str, blob_name: str, deadline: Optional[float] = None) -> str:
+    """
+    Run build(payload, output) while streaming the package into a block blob; returns the blob URL.
+    Nothing is committed once deadline (time.time()) is close, since the caller has stopped waiting.
+    """
+    with open_block_blob_writer(container, blob_name, content_type=PPTX_CONTENT_TYPE, deadline=deadline) as writer:
+        build(payload, writer)
+    return writer.url
+
+
+async def _extract_in_pool(url, data):
+    return await pptx_pool.run(extract_fragment, url, data)
+
+async def get_slide_fragments(sources: List[Tuple[str, bytes]]):
+    """
+    Look up (or extract) the fragment of every source deck, in order, skipping decks that fail
+    to parse. Extractions run in parallel, one per pptx_pool worker, so none wait out their
+    timeout in the pool's queue.
+    """
+    semaphore = asyncio.Semaphore(max(1, pptx_pool.max_workers))
+
+    async def get_fragment(url, data):
+        async with semaphore:
+            try:
+                return await fragment_index.get(url, data, _extract_in_pool)
+            except Exception as e:
+                logger.error(f"Skipping invalid slide {url}: {str(e)}")
+                return None
+
+    fragments = await asyncio.gather(*[get_fragment(url, data) for url, data in sources])
+    return [fragment for fragment in fragments if fragment is not None]
+
+async def warm_slide_fragments(slide_urls):
+    """Download and index reference slides ahead of time, SLIDE_DOWNLOAD_CONCURRENCY decks at a time"""
+    indexed = 0
+    for i in range(0, len(slide_urls), SLIDE_DOWNLOAD_CONCURRENCY):
+        batch = slide_urls[i:i + SLIDE_DOWNLOAD_CONCURRENCY]
+        downloaded = await download_slides(batch)
+        sources = [(url, data.getvalue()) for url, data in zip(batch, downloaded) if data is not None]
+        indexed += len(await get_slide_fragments(sources))
+    logger.info(f"Indexed {indexed}/{len(slide_urls)} slide fragments")
+    return indexed
+
+_warm_task: Optional[asyncio.Task] = None
+
+async def _warm_collection_fragments():
+    try:
+        await warm_slide_fragments(await list_slide_urls())
+    except asyncio.CancelledError:
         raise
+    except Exception as e:
+        logger.error(f"Slide fragment warm-up failed: {str(e)}")
+
+def schedule_slide_fragment_warmup():
+    """Index every slide the collection references in the background, unless a warm-up is running"""
+    global _warm_task
+    if SLIDE_FRAGMENTS_ENABLED and (_warm_task is None or _warm_task.done()):
+        _warm_task = asyncio.get_running_loop().create_task(_warm_collection_fragments())
+
+# Called from the app lifespan
+async def start_slide_fragment_warmup():
+    if SLIDE_FRAGMENTS_WARM_ON_START:
+        schedule_slide_fragment_warmup()
 
+async def stop_slide_fragment_warmup():
+    if _warm_task is not None and not _warm_task.done():
+        _warm_task.cancel()
+        try:
+            await _warm_task
+        except asyncio.CancelledError:
+            pass
 
 
 async def generate_combined_slides(slide_urls):
-    temp_files = []
     merged_url = None
     
     try:
         logger.info(f"Starting merge of {len(slide_urls)} slides")
         
         # Download slides
-        slides_to_merge = []
-        for url in slide_urls:
-            if downloaded := download_slide(url):
-                temp_files.append(downloaded)
-                slides_to_merge.append(downloaded)
+        downloaded = await download_slides(slide_urls)
+        slides_to_merge = [(url, data.getvalue()) for url, data in zip(slide_urls, downloaded) if data is not None]
         
         if not slides_to_merge:
             raise ValueError("No valid slides downloaded")
 
-        # Create presentation
-        prs = Presentation()
-        prs.slide_width = Inches(13.33)  # Standard 16:9 aspect ratio
-        prs.slide_height = Inches(7.5)
+        # Zip timestamps make every saved deck's bytes unique, so decks are addressed by
+        # their inputs: the build path and the ordered source decks' content hashes. Only a
+        # deck built from every source, with nothing skipped, is stored under that key.
+        build = assemble_deck if SLIDE_FRAGMENTS_ENABLED else build_combined_deck
+        content_addressed = UPLOAD_CONTENT_ADDRESSED and len(slides_to_merge) == len(slide_urls)
+        if content_addressed:
+            key = content_key(build.__name__, str(FRAGMENT_FORMAT), *[
+                f"{url} {hashlib.sha256(data).hexdigest()}" for url, data in slides_to_merge
+            ])
+            if existing_url := await find_content_addressed_blob(f"cas/decks/{key}.pptx"):
+                return existing_url
 
-        # Add slides
-        for idx, slide_file in enumerate(slides_to_merge, 1):
-            logger.info(f"Processing slide {idx}/{len(slides_to_merge)}")
-            try:
-                copy_slide_from_external_prs(prs, slide_file)
-            except Exception as e:
-                logger.error(f"Skipping invalid slide {slide_file}: {str(e)}")
-                continue
-
-        # Save presentation
-        output_file = f"merged-{uuid4()}.pptx"
-        prs.save(output_file)
-        temp_files.append(output_file)
-        logger.info(f"Presentation saved: {output_file}")
+        payload = await get_slide_fragments(slides_to_merge) if SLIDE_FRAGMENTS_ENABLED else slides_to_merge
+        content_addressed = content_addressed and len(payload) == len(slides_to_merge)
 
-        # Upload presentation
-        with open(output_file, "rb") as f:
-            file_bytes = BytesIO(f.read())
-            merged_url = await upload_file(file_bytes, output_file)
-            logger.info(f"Upload successful: {merged_url}")
+        # Merge off the event loop, streaming the package to blob storage as it is written
+        container = os.getenv("STORAGE_CONTAINER_NAME")
+        merged_url = None
+        if content_addressed:
+            try:
+                merged_url = await pptx_pool.run(
+                    build_deck_to_blob, partial(build, strict=True), payload, container,
+                    f"cas/decks/{key}.pptx", time.time() + pptx_pool.timeout
+                )
+            except IncompleteDeck as e:
+                logger.warning(f"Not storing the deck under its content key: {str(e)}")
+        if merged_url is None:
+            merged_url = await pptx_pool.run(
+                build_deck_to_blob, build, payload, container, f"merged-{uuid4()}.pptx",
+                time.time() + pptx_pool.timeout
+            )
+        logger.info(f"Upload successful: {merged_url}")
 
         return merged_url
 
     except Exception as e:
         logger.error(f"Merge failed: {str(e)}", exc_info=True)
         raise
-    finally:
-        # Cleanup temp files after successful upload
-        for file in temp_files:
-            delete_file(file)
-        logger.info("Cleanup completed")
-
@@ -1,6 +1,7 @@
 #qdrant_helpers.py
 from typing import List
 from qdrant_client.models import Record, SearchRequest, ScoredPoint
+import asyncio
 import os
 from tenacity import (
     retry,
@@ -9,8 +10,25 @@ from tenacity import (
 )
 
 from app.core.database import qdrant_client
+from app.core.metrics import counter
+from app.core.utils.hot_index import HOT_INDEX_ENABLED, HotVectorIndex
 
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+# Maximum number of queries sent in one search_batch request
+QDRANT_SEARCH_BATCH_SIZE = int(os.getenv("QDRANT_SEARCH_BATCH_SIZE", "64"))
+# search_batch requests in flight at once for one chunked search
+QDRANT_SEARCH_CONCURRENCY = int(os.getenv("QDRANT_SEARCH_CONCURRENCY", "4"))
+
+search_requests = counter("qdrant_search_requests_total")
+
+hot_index = HotVectorIndex(qdrant_client, QDRANT_COLLECTION_NAME)
+
+async def start_hot_index() -> None:
+    if HOT_INDEX_ENABLED:
+        await hot_index.start()
+
+async def stop_hot_index() -> None:
+    await hot_index.stop()
 
 async def get_documents_by_ids(list_of_ids: List[str]) -> List[Record]:
     try:
@@ -26,8 +44,38 @@ async def get_documents_by_ids(list_of_ids: List[str]) -> List[Record]:
         }
 
 
-@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
+async def list_slide_urls() -> List[str]:
+    """Distinct reference slide URLs in the collection, in scroll order"""
+    urls = {}
+    offset = None
+    while True:
+        page, offset = await qdrant_client.scroll(
+            QDRANT_COLLECTION_NAME, limit=1000, offset=offset, with_payload=["slide"], with_vectors=False
+        )
+        for record in page:
+            if record.payload and record.payload.get("slide"):
+                urls[record.payload["slide"]] = None
+        if offset is None:
+            return list(urls)
+
+
 async def search_documents(em_query: List[float], limit: int = 5) -> List[ScoredPoint]:
+    """Search the hot index when it can answer, otherwise Qdrant"""
+    local = await hot_index.search([em_query], limit) if HOT_INDEX_ENABLED else None
+    if local is not None:
+        return local[0]
+    return await _search_remote(em_query, limit)
+
+async def batch_search_documents(em_queries: List[List[float]], limit: int = 3) -> List[List[ScoredPoint]]:
+    """Search a batch against the hot index when it can answer, otherwise with one Qdrant search_batch"""
+    local = await hot_index.search(em_queries, limit) if HOT_INDEX_ENABLED and em_queries else None
+    if local is not None:
+        return local
+    return await _batch_search_remote(em_queries, limit)
+
+@retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
+async def _search_remote(em_query: List[float], limit: int = 5) -> List[ScoredPoint]:
+    search_requests.inc()
     res = await qdrant_client.search(
         collection_name=QDRANT_COLLECTION_NAME,
         query_vector=em_query,
@@ -37,11 +85,32 @@ async def search_documents(em_query: List[float], limit: int = 5) -> List[Scored
     return res
 
 @retry(wait=wait_random_exponential(min=1, max=60), stop=stop_after_attempt(3))
-async def batch_search_documents(em_queries: List[List[float]], limit: int = 3) -> List[List[ScoredPoint]]:
+async def _batch_search_remote(em_queries: List[List[float]], limit: int = 3) -> List[List[ScoredPoint]]:
     queries = [SearchRequest(vector=query, limit=limit, with_payload=True) for query in em_queries]
+    search_requests.inc()
     res = await qdrant_client.search_batch(
         collection_name=QDRANT_COLLECTION_NAME,
         requests=queries,
     )
     
     return res
+
+async def chunked_batch_search_documents(
+    em_queries: List[List[float]],
+    limit: int = 3,
+    batch_size: int = QDRANT_SEARCH_BATCH_SIZE,
+    concurrency: int = QDRANT_SEARCH_CONCURRENCY
+) -> List[List[ScoredPoint]]:
+    """
+    Search many queries with one search_batch request per batch_size queries, at most
+    concurrency requests at a time. Results are returned in the same order as em_queries.
+    """
+    chunks = [em_queries[i:i + batch_size] for i in range(0, len(em_queries), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def search(chunk: List[List[float]]) -> List[List[ScoredPoint]]:
+        async with semaphore:
+            return await batch_search_documents(chunk, limit)
+
+    results = await asyncio.gather(*[search(chunk) for chunk in chunks])
+    return [doc_set for chunk_result in results for doc_set in chunk_result]
@@ -0,0 +1,127 @@
+#rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import List, Optional, Tuple
+
+from app.core.metrics import counter, gauge, histogram
+from app.core.models import GPTModelInfo
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Priority(IntEnum):
+    """Lower values are served first"""
+    interactive = 0
+    bulk = 1
+
+# Inherited by tasks created inside the context, so a whole pipeline runs at one priority
+current_priority: ContextVar[Priority] = ContextVar("current_priority", default=Priority.interactive)
+
+@contextmanager
+def bulk_priority():
+    """Run provider calls made inside the block (and tasks it starts) behind interactive ones"""
+    token = current_priority.set(Priority.bulk)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets for one model. Callers reserve an
+    estimate before the call and settle with the provider's reported usage afterwards.
+    Waiters are served strictly by priority, then in arrival order.
+    Rates in GPTModelInfo are per 1K tokens.
+    """
+
+    def __init__(self, model: GPTModelInfo, rpm: int, tpm: int):
+        self.model = model
+        self.rpm = max(1, rpm)
+        self.tpm = max(1, tpm)
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        # (priority, arrival, tokens, future)
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        prefix = "llm_" + re.sub(r"[^a-zA-Z0-9_]", "_", model.name)
+        self.requests = counter(f"{prefix}_requests_total")
+        self.input_tokens = counter(f"{prefix}_input_tokens_total")
+        self.output_tokens = counter(f"{prefix}_output_tokens_total")
+        self.cost = counter(f"{prefix}_cost_usd_total")
+        self.queued = gauge(f"{prefix}_queued_requests")
+        self.wait_seconds = histogram(f"{prefix}_queue_wait_seconds", WAIT_BUCKETS)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int, priority: Optional[Priority] = None) -> int:
+        """Wait until the buckets hold one request and `tokens` tokens; returns the tokens reserved"""
+        priority = current_priority.get() if priority is None else priority
+        # A call larger than a minute's budget still runs, once the bucket is full
+        tokens = min(max(1, tokens), self.tpm)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._arrivals), tokens, future))
+        self.queued.inc()
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted, but the caller went away before using it
+                self._requests += 1
+                self._tokens += tokens
+                self._dispatch()
+            raise
+        finally:
+            self.queued.dec()
+            self.wait_seconds.observe(time.monotonic() - start)
+        return tokens
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._requests < 1 or self._tokens < tokens:
+                delay = max((1 - self._requests) * 60 / self.rpm, (tokens - self._tokens) * 60 / self.tpm, 0.001)
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._requests -= 1
+            self._tokens -= tokens
+            future.set_result(None)
+
+    def settle(self, reserved: int, input_tokens: int, output_tokens: int) -> None:
+        """Replace the reservation with actual usage and record throughput and cost"""
+        self._refill()
+        self._tokens = min(self.tpm, self._tokens + reserved - input_tokens - output_tokens)
+        self.requests.inc()
+        self.input_tokens.inc(input_tokens)
+        self.output_tokens.inc(output_tokens)
+        self.cost.inc(input_tokens / 1000 * self.model.input_rate + output_tokens / 1000 * self.model.output_rate)
+        if self._waiters:
+            self._dispatch()
+
+    def release(self, reserved: int) -> None:
+        """Return the tokens of a call that failed; the request itself still counts against RPM"""
+        self._refill()
+        self._tokens = min(self.tpm, self._tokens + reserved)
+        if self._waiters:
+            self._dispatch()
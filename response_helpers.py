@@ -1,101 +1,249 @@
 
 import asyncio
-from datetime import datetime
+import os
+import time
+import warnings
+from datetime import datetime, timedelta
 from fastapi import UploadFile
 from uuid import UUID
 import pandas as pd
 import numpy as np
-from typing import List, Tuple, Any, Dict, Optional
+from typing import AsyncIterator, List, Tuple, Any, Dict, Optional, Union
 from io import BytesIO
 from qdrant_client.models import ScoredPoint
 
 from app.core.logger import logger
 from app.core.models import (
     Options, BaseResponseDTO, MessageType, RFxResponseDTO, 
-    RFxType, DocReference, RFxSlideDeckResponseDTO
+    RFxType, DocReference, RFxSlideDeckResponseDTO, PendingMessage,
+    QuestionAnswerEvent, SlideDeckEvent
 )
-from app.core.utils.llm.openai_helpers import get_embeddings, get_chat_completion
+from app.core.utils.chat_scheduler import scheduled_chat_completion
+from app.core.utils.rate_limiter import bulk_priority
+from app.core.utils.context_packing import pack_context
+from app.core.utils.embedding_cache import get_cached_embeddings
 from app.core.database import get_connection  # Add this line to import get_connection
-from app.core.utils.qdrant_helpers import batch_search_documents, search_documents
-from app.core.utils.persist_helpers import add_message, fetch_messages, upload_file, create_conversation
+from app.core.utils.qdrant_helpers import batch_search_documents, chunked_batch_search_documents
+from app.core.utils.batching_scheduler import embed_query, search_query
+from app.core.utils.persist_helpers import add_message, upload_file, create_conversation
+from app.core.utils.conversation_history import fetch_last_messages
+from app.core.utils.write_behind import persist_messages, flush_conversation
 from app.core.utils.llm.prompts import refine_response_prompt, response_prompt, fallback_prompt
 from app.core.utils.shared.constants import PERCENTILE, CUTOFF
 from app.core.utils.pptx_helpers import generate_combined_slides
+from app.core.utils.answer_cache import get_or_generate_answers
+from app.core.utils.file_pipeline import AnswerFileWriter, read_questions, run_file_pipeline
+
+MULTIPLE_QUERIES_CONCURRENCY = int(os.getenv("MULTIPLE_QUERIES_CONCURRENCY", "5"))
+# Matches the search_documents default used by find_relevant_docs
+SEARCH_LIMIT = 5
+# Documents searched per questionnaire row, whether the file is answered directly or as a job
+FILE_SEARCH_LIMIT = 3
 
 # Helper functions
 async def get_answer(question: str, rf_type: RFxType, options: Options, 
-                    conversation_id: UUID, limit: int, fallback: bool) -> Tuple[List[BaseResponseDTO], Dict]:
-    em_query = await get_embeddings(question)
-    rel_responses, unique_payloads = await find_relevant_docs(em_query)
+                    conversation_id: UUID, limit: int, fallback: bool,
+                    em_query: Optional[List[float]] = None,
+                    rel_docs: Optional[List[ScoredPoint]] = None) -> Tuple[List[BaseResponseDTO], Dict]:
+    if em_query is None:
+        em_query = await embed_query(question)
+    if rel_docs is None:
+        rel_responses, unique_payloads = await find_relevant_docs(em_query)
+    else:
+        rel_responses, unique_payloads = filter_docs(rel_docs, PERCENTILE)
+    rel_responses = pack_context(rel_responses)
     
     system_message = {
         "role": "system",
         "content": fallback_prompt(options, True) if not rel_responses else response_prompt("\n".join(rel_responses), rf_type, options, True)
     }
     messages = [system_message, {"role": "user", "content": question}]
-    answers = await answer_one_question(messages, unique_payloads, limit)
+    answers = await get_or_generate_answers(
+        question, rel_responses, unique_payloads, options, rf_type, limit,
+        lambda: answer_one_question(messages, unique_payloads, limit),
+        em_query=em_query
+    )
     
     return answers, unique_payloads
 
-async def new_multiple_queries(
+async def answer_question_for_deck(
+    question: str,
+    rf_type: str,
+    options: Options,
+    conversation_id: UUID,
+    limit: int,
+    fallback: bool,
+    semaphore: asyncio.Semaphore,
+    em_query: Optional[List[float]] = None,
+    rel_docs: Optional[List[ScoredPoint]] = None
+) -> Tuple[RFxResponseDTO, bool]:
+    """
+    Answer a single question, isolating its failure from the rest of the batch.
+    Returns the response and whether it holds real answers worth persisting.
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            answer_response, _ = await get_answer(
+                question, rf_type, options, conversation_id, limit, fallback, em_query, rel_docs
+            )
+            succeeded = True
+        except Exception as e:
+            logger.exception(f"Error answering question '{question[:50]}': {str(e)}")
+            answer_response = [BaseResponseDTO(
+                text="An error occurred while answering this question.",
+                sender="assistant",
+                referenceLinks=[]
+            )]
+        finally:
+            logger.info(f"Answered question '{question[:50]}' in {time.perf_counter() - start:.2f}s")
+
+        return RFxResponseDTO(
+            conversation_id=conversation_id,
+            question=question,
+            results=answer_response
+        ), succeeded
+
+def answer_messages(conversation_id: UUID, answers: List[BaseResponseDTO]) -> List[PendingMessage]:
+    return [PendingMessage(
+        text=answer.text,
+        doc_references=answer.referenceLinks or [],
+        msg_type=MessageType.system,
+        conversation_id=conversation_id,
+        sender="assistant"
+    ) for answer in answers]
+
+async def _prepare_multiple_queries(
+    conversation_id: UUID,
+    questions: List[str]
+) -> Tuple[List[Optional[List[float]]], List[Optional[List[ScoredPoint]]]]:
+    # Create conversation
+    async with get_connection() as conn:
+        await create_conversation(
+            conn=conn,
+            conversation_id=conversation_id,
+            title=f"Multiple Questions {conversation_id}"
+        )
+
+    # Embed and search every question up front; on failure each question falls back to its own calls
+    em_queries = [None] * len(questions)
+    doc_sets = [None] * len(questions)
+    try:
+        em_queries = await batch_embed(questions)
+        doc_sets = await chunked_batch_search_documents(em_queries, limit=SEARCH_LIMIT)
+    except Exception as e:
+        logger.error(f"Batch embedding/search failed, processing questions individually: {str(e)}")
+    return em_queries, doc_sets
+
+async def stream_multiple_queries(
     conversation_id: UUID,
     user_id: str, 
     rf_type: str,
     questions: List[str],
     options: Options,
     limit: int,
-    fallback: bool
-) -> RFxSlideDeckResponseDTO:
+    fallback: bool,
+    concurrency: int = MULTIPLE_QUERIES_CONCURRENCY
+) -> AsyncIterator[Union[QuestionAnswerEvent, SlideDeckEvent]]:
+    """
+    Answer the questions concurrently, yielding each answer as soon as it is ready
+    (in completion order, tagged with its question index) and the slide deck URL last.
+    Closing the generator early cancels the questions still in flight.
+    """
+    em_queries, doc_sets = await _prepare_multiple_queries(conversation_id, questions)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer(index: int, question: str, em_query, rel_docs):
+        response, succeeded = await answer_question_for_deck(
+            question, rf_type, options, conversation_id, limit, fallback, semaphore, em_query, rel_docs
+        )
+        return index, response, succeeded
+
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(answer(i, question, em_query, rel_docs))
+        for i, (question, em_query, rel_docs) in enumerate(zip(questions, em_queries, doc_sets))
+    ]
+    # Kept by question index, so the saved conversation and the deck follow question order
+    answers: List[Optional[RFxResponseDTO]] = [None] * len(questions)
+    per_question: List[List[PendingMessage]] = [[] for _ in questions]
     try:
-        # Create conversation
-        async with get_connection() as conn:
-            await create_conversation(
-                conn=conn,
-                conversation_id=conversation_id,
-                title=f"Multiple Questions {conversation_id}"
-            )
+        for next_done in asyncio.as_completed(tasks):
+            index, response, succeeded = await next_done
+            answers[index] = response
+            if succeeded:
+                per_question[index] = answer_messages(conversation_id, response.results)
+            yield QuestionAnswerEvent(index=index, question=questions[index], answer=response)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Runs on an early disconnect too, so answers already sent are not lost
+        await _persist_answers(conversation_id, per_question)
+    logger.info(f"Answered {len(questions)} questions in {time.perf_counter() - start:.2f}s (concurrency={concurrency})")
+
+    yield SlideDeckEvent(slide_deck=await combined_slide_deck([answer for answer in answers if answer is not None]))
+
+async def _persist_answers(conversation_id: UUID, per_question: List[List[PendingMessage]]) -> None:
+    """Save every answer of every question in one transaction, in question order"""
+    messages = [msg for question_messages in per_question for msg in question_messages]
+    if not messages:
+        return
+    # History is read back by timestamp, and answers were stamped as they completed
+    saved_at = datetime.now()
+    for offset, msg in enumerate(messages):
+        msg.timestamp = saved_at + timedelta(microseconds=offset)
+    try:
+        # Shielded: when the client disconnects the request task is cancelled mid-save
+        await asyncio.shield(persist_messages(messages))
+    except Exception as e:
+        logger.exception(f"Error saving answers for conversation {conversation_id}: {str(e)}")
+
+async def combined_slide_deck(answers: List[RFxResponseDTO]) -> str:
+    """Merge the slides referenced by the answers into one deck; returns its URL or "" """
+    # Collect slide URLs if they exist
+    slides_urls = [
+        ref.slide
+        for answer in answers
+        for result in answer.results
+        for ref in (result.referenceLinks or [])
+        if ref.slide
+    ]
 
-        answers = []
-        slides_urls = []
+    # Set default slide_deck URL
+    slide_deck_url = ""
 
-        # Process questions
-        for question in questions:
-            answer_response, _ = await get_answer(
-                question, rf_type, options, conversation_id, limit, fallback
-            )
-            
-            # Save answers
-            for answer in answer_response:
-                await add_message(
-                    msg_text=answer.text,
-                    doc_references=answer.referenceLinks,
-                    msg_type=MessageType.system,
-                    conversation_id=conversation_id,
-                    sender="assistant"
-                )
-                
-                # Collect slide URLs if they exist
-                if answer.referenceLinks:
-                    for ref in answer.referenceLinks:
-                        if ref.slide:
-                            slides_urls.append(ref.slide)
-
-            answers.append(RFxResponseDTO(
-                conversation_id=conversation_id,
-                question=question,
-                results=answer_response
-            ))
+    # Generate combined slides if we have any
+    if slides_urls:
+        try:
+            slide_deck_url = await generate_combined_slides(slides_urls) or ""
+        except Exception as e:
+            logger.error(f"Error generating slides: {str(e)}")
+            slide_deck_url = ""
+    return slide_deck_url
 
-        # Set default slide_deck URL
+async def new_multiple_queries(
+    conversation_id: UUID,
+    user_id: str, 
+    rf_type: str,
+    questions: List[str],
+    options: Options,
+    limit: int,
+    fallback: bool,
+    concurrency: int = MULTIPLE_QUERIES_CONCURRENCY
+) -> RFxSlideDeckResponseDTO:
+    try:
+        answers = [None] * len(questions)
         slide_deck_url = ""
-
-        # Generate combined slides if we have any
-        if slides_urls:
-            try:
-                slide_deck_url = await generate_combined_slides(slides_urls) or ""
-            except Exception as e:
-                logger.error(f"Error generating slides: {str(e)}")
-                slide_deck_url = ""
+        async for event in stream_multiple_queries(
+            conversation_id, user_id, rf_type, questions, options, limit, fallback, concurrency
+        ):
+            if isinstance(event, QuestionAnswerEvent):
+                # Back into the original question order
+                answers[event.index] = event.answer
+            else:
+                slide_deck_url = event.slide_deck
 
         return RFxSlideDeckResponseDTO(
             slide_deck=slide_deck_url,
@@ -112,12 +260,12 @@ async def new_multiple_queries(
 
 # Helper functions
 async def find_relevant_docs(em_query: List[float]) -> Tuple[List[str], Dict[Any, Dict[str, Any]]]:
-    rel_docs = await search_documents(em_query)
+    rel_docs = await search_query(em_query)
     rel_responses, unique_payloads = filter_docs(rel_docs, PERCENTILE)
     return rel_responses, unique_payloads
 
 async def answer_one_question(messages: List[Dict[str, str]], unique_payloads: Dict[Any, Dict[str, Any]], n: int) -> List[BaseResponseDTO]:
-    response = await get_chat_completion(messages, temperature=0.2, n=n)
+    response = await scheduled_chat_completion(messages, temperature=0.2, n=n)
     choices = response.choices
     content = [c.message.content.replace("\n", "") for c in choices]
     
@@ -135,22 +283,21 @@ async def answer_one_question(messages: List[Dict[str, str]], unique_payloads: D
 async def refine(conversation_id: UUID, user_id: UUID, rf_type: RFxType, question: str, 
                 options: Options, limit: int, fallback: bool) -> RFxResponseDTO:
     try:
-        await add_message(msg_text=question, doc_references=[], msg_type=MessageType.user,
-                         conversation_id=conversation_id, file_links=None, sender="user")
+        await persist_messages([PendingMessage(text=question, msg_type=MessageType.user,
+                                               conversation_id=conversation_id, sender="user")])
+        await flush_conversation(conversation_id)
         
-        messages = await fetch_messages(conversation_id)
-        orig_question = messages[-1]
-        embedded_question = await get_embeddings(question + orig_question['text'])
+        orig_question = (await fetch_last_messages(conversation_id, 1))[-1]
+        embedded_question = await embed_query(question + orig_question['text'])
         rel_responses, unique_payloads = await find_relevant_docs(embedded_question)
+        rel_responses = pack_context(rel_responses, separator=" ")
         
         system_message = {"role": "system", "content": refine_response_prompt(" ".join(rel_responses), rf_type, options)}
         messages = [system_message, {"role": "user", "content": question}]
         
         answers = await answer_one_question(messages, unique_payloads, limit)
         
-        await asyncio.gather(*[add_message(msg_text=answer.text, doc_references=answer.referenceLinks,
-                             msg_type=MessageType.system, conversation_id=conversation_id,
-                             file_links=None, sender="assistant") for answer in answers])
+        await persist_messages(answer_messages(conversation_id, answers))
         
         return RFxResponseDTO(conversation_id=conversation_id, question=question, results=answers)
     except Exception as e:
@@ -161,11 +308,12 @@ async def refine(conversation_id: UUID, user_id: UUID, rf_type: RFxType, questio
 async def new_query(conversation_id: UUID, rf_type: RFxType, question: str,
                    options: Options, limit: int, fallback: bool) -> RFxResponseDTO:
     try:
-        await add_message(msg_text=question, doc_references=[], msg_type=MessageType.user,
-                         conversation_id=conversation_id, file_links=None, sender="user")
+        await persist_messages([PendingMessage(text=question, msg_type=MessageType.user,
+                                               conversation_id=conversation_id, sender="user")])
         
-        em_query = await get_embeddings(question)
+        em_query = await embed_query(question)
         rel_responses, unique_payloads = await find_relevant_docs(em_query)
+        rel_responses = pack_context(rel_responses)
         
         if not rel_responses and not fallback:
             response = RFxResponseDTO(
@@ -177,9 +325,7 @@ async def new_query(conversation_id: UUID, rf_type: RFxType, question: str,
                     referenceLinks=[]
                 )]
             )
-            await add_message(msg_text=response.results[0].text, doc_references=[],
-                            msg_type=MessageType.system, conversation_id=conversation_id,
-                            file_links=None, sender="assistant")
+            await persist_messages(answer_messages(conversation_id, response.results))
             return response
             
         system_message = {
@@ -188,11 +334,13 @@ async def new_query(conversation_id: UUID, rf_type: RFxType, question: str,
         }
         messages = [system_message, {"role": "user", "content": question}]
         
-        answers = await answer_one_question(messages, unique_payloads, limit)
+        answers = await get_or_generate_answers(
+            question, rel_responses, unique_payloads, options, rf_type, limit,
+            lambda: answer_one_question(messages, unique_payloads, limit),
+            em_query=em_query
+        )
         
-        await asyncio.gather(*[add_message(msg_text=answer.text, doc_references=answer.referenceLinks,
-                             msg_type=MessageType.system, conversation_id=conversation_id,
-                             file_links=None, sender="assistant") for answer in answers])
+        await persist_messages(answer_messages(conversation_id, answers))
         
         return RFxResponseDTO(conversation_id=conversation_id, question=question, results=answers)
     except Exception as e:
@@ -202,44 +350,65 @@ async def new_query(conversation_id: UUID, rf_type: RFxType, question: str,
 async def process_file(file: UploadFile, options: Options, rf_type: RFxType, out_file: str,
                       fallback: bool, conversation_id: UUID, user_id: UUID) -> BaseResponseDTO:
     try:
-        df = pd.read_csv(file.file) if file.content_type == "text/csv" else pd.read_excel(file.file)
-        questions = df.iloc[:, 0].tolist()
-        
-        em_qs = await batch_embed(questions)
-        documents = await batch_search_documents(em_qs)
-        
-        results = []
-        for doc_set in documents:
-            rel_responses, unique_payloads = filter_docs(doc_set, PERCENTILE)
-            results.append((rel_responses, unique_payloads))
-            
-        all_answers = []
-        for i, (rel_responses, unique_payloads) in enumerate(results):
-            messages = [{
-                "role": "system",
-                "content": fallback_prompt(options, False) if not rel_responses else response_prompt("\n".join(rel_responses), rf_type, options, False)
-            }, {
-                "role": "user",
-                "content": questions[i]
-            }]
-            answers = await answer_one_question(messages, unique_payloads, 1)
-            all_answers.append(answers)
-            
-        buffer = create_file(questions, all_answers, out_file)
-        out_file_name = f"{file.filename.split('.')[0]}-response-{datetime.utcnow().strftime('%d_%m_%Y-%H_%M_%S')}.{out_file}"
-        url = await upload_file(buffer, out_file_name)
-        
-        msg_text = f"File {out_file_name} created."
-        final_response = BaseResponseDTO(text=msg_text, referenceLinks=[], file_links=[url], sender="assistant")
-        
-        await add_message(msg_text=msg_text, doc_references=[], msg_type=MessageType.system,
-                         conversation_id=conversation_id, file_links=[url], sender="assistant")
-                         
-        return final_response
+        # Rows stream from the upload to the output file; only a bounded window is in memory
+        writer = AnswerFileWriter(out_file)
+        with bulk_priority():
+            await run_file_pipeline(
+                read_questions(file.file, file.content_type),
+                embed=batch_embed,
+                search=lambda em_queries: chunked_batch_search_documents(em_queries, limit=FILE_SEARCH_LIMIT),
+                select=lambda doc_sets: filter_docs_batch(doc_sets, PERCENTILE),
+                answer=lambda question, em_query, selected: answer_filtered_file_question(
+                    question, options, rf_type, em_query, *selected
+                ),
+                write=writer.write_row,
+            )
+        return await upload_answers_file(writer.close(), out_file, file.filename, conversation_id)
     except Exception as e:
         logger.exception(f"Error processing file: {str(e)}")
         raise
 
+async def answer_file_question(question: str, options: Options, rf_type: RFxType,
+                               em_query: List[float], doc_set: List[ScoredPoint]) -> List[BaseResponseDTO]:
+    """Answer one questionnaire row with the file-export prompt"""
+    rel_responses, unique_payloads = filter_docs(doc_set, PERCENTILE)
+    return await answer_filtered_file_question(question, options, rf_type, em_query, rel_responses, unique_payloads)
+
+async def answer_filtered_file_question(question: str, options: Options, rf_type: RFxType, em_query: List[float],
+                                        rel_responses: List[str], unique_payloads) -> List[BaseResponseDTO]:
+    rel_responses = pack_context(rel_responses)
+    messages = [{
+        "role": "system",
+        "content": fallback_prompt(options, False) if not rel_responses else response_prompt("\n".join(rel_responses), rf_type, options, False)
+    }, {
+        "role": "user",
+        "content": question
+    }]
+    return await get_or_generate_answers(
+        question, rel_responses, unique_payloads, options, rf_type, 1,
+        lambda: answer_one_question(messages, unique_payloads, 1),
+        em_query=em_query,
+        variant="file"
+    )
+
+async def save_answers_file(questions: List[str], all_answers: List[List[BaseResponseDTO]], out_file: str,
+                            source_name: str, conversation_id: UUID) -> BaseResponseDTO:
+    """Write the answered questionnaire, upload it and record it in the conversation"""
+    return await upload_answers_file(create_file(questions, all_answers, out_file), out_file, source_name, conversation_id)
+
+async def upload_answers_file(buffer: BytesIO, out_file: str, source_name: str,
+                              conversation_id: UUID) -> BaseResponseDTO:
+    out_file_name = f"{source_name.split('.')[0]}-response-{datetime.utcnow().strftime('%d_%m_%Y-%H_%M_%S')}.{out_file}"
+    url = await upload_file(buffer, out_file_name)
+    
+    msg_text = f"File {out_file_name} created."
+    final_response = BaseResponseDTO(text=msg_text, referenceLinks=[], file_links=[url], sender="assistant")
+    
+    await add_message(msg_text=msg_text, doc_references=[], msg_type=MessageType.system,
+                     conversation_id=conversation_id, file_links=[url], sender="assistant")
+                     
+    return final_response
+
 
 def load_file(file: UploadFile) -> pd.DataFrame:
     """Load file content into DataFrame"""
@@ -257,8 +426,7 @@ def load_file(file: UploadFile) -> pd.DataFrame:
 async def batch_embed(questions: List[str]) -> List[List[float]]:
     """Batch embed questions using OpenAI embeddings"""
     try:
-        tasks = [get_embeddings(question) for question in questions]
-        return await asyncio.gather(*tasks)
+        return await get_cached_embeddings(questions)
     except Exception as e:
         logger.error(f"Error in batch embedding: {str(e)}")
         raise
@@ -299,8 +467,48 @@ def filter_docs(rel_docs: List[ScoredPoint], p: int) -> Tuple[List[str], dict[An
     unique_payloads = {obj["payload"]["source"]: obj for obj in rel_payloads}.values()
     return rel_responses, unique_payloads
 
+def filter_docs_batch(doc_sets: List[List[ScoredPoint]], p: int) -> List[Tuple[List[str], dict[Any, dict[str, Any]]]]:
+    """
+    filter_docs for a whole search_batch result: the percentile thresholds, CUTOFF check and
+    score mask are computed for every query at once on a NaN-padded score matrix.
+    Returns the same (rel_responses, unique_payloads) per query as filter_docs.
+    """
+    if not doc_sets:
+        return []
+    width = max(len(doc_set) for doc_set in doc_sets)
+    if width == 0:
+        # Nothing retrieved for any query; percentile needs at least one column
+        return [([], {}) for _ in doc_sets]
+    scores = np.full((len(doc_sets), width), np.nan)
+    for row, doc_set in enumerate(doc_sets):
+        scores[row, :len(doc_set)] = [doc.score for doc in doc_set]
+
+    if all(len(doc_set) == width for doc_set in doc_sets):
+        thresholds = np.percentile(scores, p, axis=1)
+    else:
+        with warnings.catch_warnings():
+            # Empty result rows have no threshold and are dropped by the CUTOFF check below
+            warnings.simplefilter("ignore", RuntimeWarning)
+            thresholds = np.nanpercentile(scores, p, axis=1)
+    # NaN compares False, so padding and empty rows never pass
+    mask = (scores > thresholds[:, None]) & (thresholds >= CUTOFF)[:, None]
+
+    rel_payloads = [[] for _ in doc_sets]
+    for row, col in zip(*np.nonzero(mask)):
+        doc = doc_sets[row][col]
+        if doc.payload is not None:
+            rel_payloads[row].append({"doc_id": doc.id, "payload": doc.payload})
+
+    return [
+        (
+            [pl["payload"]["answer"] for pl in payloads if pl["payload"]["answer"] is not None],
+            {obj["payload"]["source"]: obj for obj in payloads}.values()
+        ) if thresholds[row] >= CUTOFF else ([], {})
+        for row, payloads in enumerate(rel_payloads)
+    ]
+
 async def answer_one_question(messages: List[dict[str, str]], unique_payloads: dict[Any, dict[str, Any]], n: int) -> List[BaseResponseDTO]:
-    response = await get_chat_completion(messages, temperature=0.2, n=n)
+    response = await scheduled_chat_completion(messages, temperature=0.2, n=n)
     choices = response.choices
     content = [c.message.content.replace("\n", "") for c in choices]
 
@@ -319,7 +527,7 @@ async def answer_one_question(messages: List[dict[str, str]], unique_payloads: d
 
 
 async def find_relevant_docs(em_query: List[float]) -> Tuple[List[str], dict[Any, dict[str, Any]]]:
-    rel_docs = await search_documents(em_query)
+    rel_docs = await search_query(em_query)
     rel_responses, unique_payloads = filter_docs(rel_docs, PERCENTILE)
     
     return rel_responses, unique_payloads
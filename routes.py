@@ -1,8 +1,9 @@
 
 # routes.py
 import os
+import json
 import uuid
-from fastapi.responses import FileResponse,JSONResponse
+from fastapi.responses import FileResponse,JSONResponse,PlainTextResponse,StreamingResponse
 from uuid import UUID, uuid4
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status,Body, Query, Form
 from typing import Optional, List
@@ -10,13 +11,22 @@ from fastapi_microsoft_identity import requires_auth
 from app.core.models import RFxResponseDTO, Options, ConversationsDTO
 from app.core.security import DecodedToken, get_user_ad, sanitize_input
 from app.core.logger import logger
+from app.core.metrics import render_prometheus
+from app.core.utils.answer_cache import invalidate_answer_cache
+from app.core.utils.qdrant_helpers import hot_index
+from app.core.utils.pptx_helpers import schedule_slide_fragment_warmup
 from app.core.utils.new.process_file import get_document_from_file
 from app.core.utils.new.translate import get_translate_results
 from app.core.utils.new.document.chatbot import chat_with_document
 from app.api.v2.service import RFXService
 from app.core.utils.new.save_as_file import save_translated_file
 from pathlib import Path
-from app.core.models import RFxResponseDTO, Options, ConversationsDTO, RFxSlideDeckResponseDTO, MultipleQuestions
+from app.core.models import RFxResponseDTO, Options, ConversationsDTO, RFxSlideDeckResponseDTO, MultipleQuestions, ConversationsPageDTO
+from app.core.models import RFxType, QuestionAnswerEvent, JobDTO, JobKind
+from app.core.utils.response_helpers import stream_multiple_queries
+from app.core.utils.file_pipeline import read_questions
+from app.core.utils.jobs import submit_job, get_job, watch_job
+from app.core.utils.persist_helpers import fetch_conversations_page, stream_conversations
 
 router = APIRouter(prefix="/v2")
 service = RFXService()
@@ -65,4 +75,165 @@ async def generate_multiple_questions(
     except Exception as e:
         logger.exception(f"Error in multiple questions generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+
+@router.post("/multiple-questions/stream", operation_id="stream_multiple_questions")
+async def stream_multiple_questions(
+    body: MultipleQuestions,
+    limit: Optional[int] = 3,
+    fallback: Optional[bool] = False,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+) -> StreamingResponse:
+    """
+    Same as /multiple-questions, but sends each answer as soon as its question completes
+    ("answer" events, in completion order, with the question index) and the slide deck URL
+    as the final "slide_deck" event. format=ndjson sends one {"event", "data"} object per line.
+    """
+    questions_copy = [sanitize_input(q) for q in body.questions]
+    options = Options(
+        length=sanitize_input(body.length) if body.length else service.default_options_config,
+        tone=sanitize_input(body.tone) if body.tone else service.default_options_config
+    )
+    conversation_id = uuid4()
+    mock_user_id = str(uuid4())  # Temporary user ID for testing
+
+    def encode(event: str, data: str) -> str:
+        if format == "ndjson":
+            return f'{{"event": "{event}", "data": {data}}}\n'
+        return f"event: {event}\ndata: {data}\n\n"
+
+    async def events():
+        try:
+            async for event in stream_multiple_queries(
+                conversation_id, mock_user_id, RFxType.proposal.value,
+                questions_copy, options, limit, fallback
+            ):
+                name = "answer" if isinstance(event, QuestionAnswerEvent) else "slide_deck"
+                yield encode(name, event.model_dump_json())
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band
+            logger.exception(f"Error in streamed multiple questions generation: {e}")
+            yield encode("error", json.dumps({"detail": str(e)}))
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs/multiple-questions", operation_id="submit_multiple_questions_job", status_code=status.HTTP_202_ACCEPTED)
+async def submit_multiple_questions_job(
+    body: MultipleQuestions,
+    limit: Optional[int] = 3,
+    fallback: Optional[bool] = False,
+) -> JobDTO:
+    """Queue a /multiple-questions batch; poll GET /jobs/{job_id} or subscribe to its events"""
+    questions_copy = [sanitize_input(q) for q in body.questions]
+    options = Options(
+        length=sanitize_input(body.length) if body.length else service.default_options_config,
+        tone=sanitize_input(body.tone) if body.tone else service.default_options_config
+    )
+    conversation_id = uuid4()
+    job_id = await submit_job(
+        JobKind.multiple_questions,
+        questions_copy,
+        {"options": options.model_dump(), "rf_type": RFxType.proposal.value, "limit": limit, "fallback": fallback},
+        conversation_id,
+        conversation_title=f"Multiple Questions {conversation_id}"
+    )
+    return await get_job(job_id)
+
+
+@router.post("/jobs/file", operation_id="submit_file_job", status_code=status.HTTP_202_ACCEPTED)
+async def submit_file_job(
+    file: UploadFile = File(...),
+    conversation_id: UUID = Form(...),
+    out_file: str = Form("xlsx", pattern="^(csv|xlsx)$"),
+    rf_type: RFxType = Form(RFxType.proposal),
+    length: Optional[str] = Form(None),
+    tone: Optional[str] = Form(None),
+    fallback: bool = Form(False),
+) -> JobDTO:
+    """Queue a questionnaire file; the answered file's URL is in the finished job's result"""
+    try:
+        questions = list(read_questions(file.file, file.content_type))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not questions:
+        raise HTTPException(status_code=400, detail="File contains no questions")
+    options = Options(
+        length=sanitize_input(length) if length else service.default_options_config,
+        tone=sanitize_input(tone) if tone else service.default_options_config
+    )
+    job_id = await submit_job(
+        JobKind.file,
+        questions,
+        {"options": options.model_dump(), "rf_type": rf_type.value, "out_file": out_file, "file_name": file.filename},
+        conversation_id
+    )
+    return await get_job(job_id)
+
+
+@router.get("/jobs/{job_id}", operation_id="get_job")
+async def get_job_status(job_id: UUID) -> JobDTO:
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events", operation_id="stream_job_events")
+async def stream_job_events(job_id: UUID) -> StreamingResponse:
+    """Server-sent "job" events on every status or progress change, ending when the job finishes"""
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in watch_job(job_id):
+            yield f"event: job\ndata: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/metrics", operation_id="get_metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    return render_prometheus()
+
+
+@router.post("/answer-cache/invalidate", operation_id="invalidate_answer_cache")
+async def invalidate_cached_answers(user: DecodedToken = Depends(get_user_ad)) -> dict:
+    """Call after the Qdrant collection has been re-indexed"""
+    logger.info(f"Answer cache invalidated by {user.user_id}")
+    hot_index.mark_stale()
+    schedule_slide_fragment_warmup()
+    return {"invalidated": invalidate_answer_cache()}
+
+
+@router.get("/conversations", operation_id="list_conversations")
+async def list_conversations(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    user: DecodedToken = Depends(get_user_ad),
+) -> ConversationsPageDTO:
+    try:
+        rows, next_cursor = await fetch_conversations_page(user.user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ConversationsPageDTO(
+        items=[ConversationsDTO(**dict(row)) for row in rows],
+        next_cursor=next_cursor
+    )
+
+
+@router.get("/conversations/export", operation_id="export_conversations")
+async def export_conversations(user: DecodedToken = Depends(get_user_ad)) -> StreamingResponse:
+    async def ndjson():
+        async for row in stream_conversations(user.user_id):
+            yield ConversationsDTO(**dict(row)).model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
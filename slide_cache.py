@@ -0,0 +1,201 @@
+#slide_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.logger import logger
+from app.core.metrics import counter, gauge
+from app.core.utils.cache_helpers import ensure_private_dir
+
+SLIDE_CACHE_ENABLED = os.getenv("SLIDE_CACHE_ENABLED", "true").lower() == "true"
+# Cached decks are spliced into customer decks, so the directory must be private (owned by this user, mode 0700)
+SLIDE_CACHE_DIR = os.getenv("SLIDE_CACHE_DIR", os.path.join(tempfile.gettempdir(), f"rfx-slide-cache-{os.getuid()}"))
+# Bounds the directory as a whole, even when several worker processes share it
+SLIDE_CACHE_MAX_BYTES = int(os.getenv("SLIDE_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+hits = counter("slide_cache_hits_total")
+misses = counter("slide_cache_misses_total")
+stale_hits = counter("slide_cache_stale_hits_total")
+shared_fetches = counter("slide_cache_shared_fetches_total")
+bytes_saved = counter("slide_cache_bytes_saved_total")
+evictions = counter("slide_cache_evictions_total")
+cached_bytes = gauge("slide_cache_bytes")
+
+class SlideFetch(NamedTuple):
+    data: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+# fetch(url, etag, last_modified) returns None when the cached copy is still current
+Fetcher = Callable[[str, Optional[str], Optional[str]], Awaitable[Optional[SlideFetch]]]
+
+class SlideCache:
+    """
+    Size-bounded on-disk LRU of source decks keyed by URL. Entries are revalidated with
+    ETag/Last-Modified on every use, and concurrent requests for one URL share a single fetch.
+    Worker processes may share the directory, so eviction measures its usage on disk instead
+    of trusting this process's own count.
+    """
+
+    def __init__(self, directory: str = SLIDE_CACHE_DIR, max_bytes: int = SLIDE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._index: Optional["OrderedDict[str, dict]"] = None
+        self._disk_enabled = True
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return f"{base}.pptx", f"{base}.json"
+
+    def _load_index(self) -> Optional["OrderedDict[str, dict]"]:
+        """The cached entries, or None when the directory isn't safe to use"""
+        if self._index is None and self._disk_enabled:
+            try:
+                ensure_private_dir(self.directory)
+            except OSError as e:
+                logger.error(f"Not caching slides on disk: {str(e)}")
+                self._disk_enabled = False
+                return None
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-5]
+                data_path, meta_path = self._paths(key)
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    entries.append((os.path.getmtime(data_path), key, meta))
+                except (OSError, ValueError):
+                    continue
+            self._index = OrderedDict((key, meta) for _, key, meta in sorted(entries))
+            self.total_bytes = sum(meta["size"] for meta in self._index.values())
+            cached_bytes.set(self.total_bytes)
+        return self._index
+
+    async def get(self, url: str, fetch: Fetcher) -> bytes:
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._get(url, fetch))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        else:
+            shared_fetches.inc()
+        # Shield so one caller's timeout doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _get(self, url: str, fetch: Fetcher) -> bytes:
+        index = await asyncio.to_thread(self._load_index)
+        if index is None:
+            misses.inc()
+            return (await fetch(url, None, None)).data
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        meta = index.get(key)
+
+        if meta is not None:
+            try:
+                result = await fetch(url, meta.get("etag"), meta.get("last_modified"))
+            except Exception as e:
+                data = await self._read(key)
+                if data is None:
+                    raise
+                logger.warning(f"Revalidation failed for {url}, serving cached copy: {str(e)}")
+                stale_hits.inc()
+                return data
+            if result is None:
+                data = await self._read(key)
+                if data is not None:
+                    hits.inc()
+                    bytes_saved.inc(len(data))
+                    return data
+                result = await fetch(url, None, None)
+        else:
+            result = await fetch(url, None, None)
+
+        misses.inc()
+        if result.etag or result.last_modified:
+            await self._store(key, url, result)
+        return result.data
+
+    async def _read(self, key: str) -> Optional[bytes]:
+        data_path, _ = self._paths(key)
+        try:
+            data = await asyncio.to_thread(_read_bytes, data_path)
+        except OSError:
+            self._remove(key)
+            return None
+        self._index.move_to_end(key)
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+        return data
+
+    async def _store(self, key: str, url: str, result: SlideFetch) -> None:
+        data_path, meta_path = self._paths(key)
+        meta = {"url": url, "etag": result.etag, "last_modified": result.last_modified, "size": len(result.data)}
+        try:
+            await asyncio.to_thread(_write_atomic, data_path, result.data)
+            await asyncio.to_thread(_write_atomic, meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logger.error(f"Error caching slide {url}: {str(e)}")
+            return
+        self._index.pop(key, None)
+        self._index[key] = meta
+        await self._evict(keep=key)
+
+    async def _evict(self, keep: str) -> None:
+        """Remove least recently used decks, by mtime across all processes, until the directory fits"""
+        entries = await asyncio.to_thread(self._disk_usage)
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= size
+            evictions.inc()
+        self.total_bytes = total
+        cached_bytes.set(total)
+
+    def _disk_usage(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pptx"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name[:-5]))
+        return entries
+
+    def _remove(self, key: str) -> None:
+        meta = self._index.pop(key, None)
+        if meta is not None:
+            self.total_bytes -= meta["size"]
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        cached_bytes.set(self.total_bytes)
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+slide_cache = SlideCache()
@@ -0,0 +1,310 @@
+#slide_fragments.py
+import asyncio
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import Part
+from pptx.oxml import parse_xml
+from pptx.parts.image import ImagePart
+from pptx.util import Inches
+from lxml import etree
+
+from app.core.logger import logger
+from app.core.metrics import counter
+from app.core.utils.cache_helpers import ensure_private_dir
+
+SLIDE_FRAGMENTS_ENABLED = os.getenv("SLIDE_FRAGMENTS_ENABLED", "true").lower() == "true"
+# Fragments are pickled, so the directory must be private (owned by this user, mode 0700)
+SLIDE_FRAGMENT_DIR = os.getenv("SLIDE_FRAGMENT_DIR", os.path.join(tempfile.gettempdir(), f"rfx-slide-fragments-{os.getuid()}"))
+SLIDE_FRAGMENT_MEMORY_ENTRIES = int(os.getenv("SLIDE_FRAGMENT_MEMORY_ENTRIES", "500"))
+
+# Formats add_picture takes as-is; anything else is converted to PNG
+SUPPORTED_IMAGE_TYPES = {"image/png", "image/jpeg"}
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+# Bumped whenever the pickled layout changes, so older files are re-extracted
+FRAGMENT_FORMAT = 2
+
+memory_hits = counter("slide_fragment_memory_hits_total")
+disk_hits = counter("slide_fragment_disk_hits_total")
+extractions = counter("slide_fragment_extractions_total")
+
+class IncompleteDeck(Exception):
+    """A strict build hit a slide or shape it would otherwise have skipped"""
+
+# rId -> (reltype, external URL or PartFragment, is_external)
+Relationships = Dict[str, Tuple[str, Any, bool]]
+
+class PartFragment(NamedTuple):
+    """A package part (chart, diagram, embedding, image) that shape XML refers to by rId"""
+    partname: str
+    content_type: str
+    blob: Optional[bytes] = None  # None for images, which are shared through SlideFragment.media
+    image_sha1: Optional[str] = None
+    rels: Optional[Relationships] = None
+
+class ShapeFragment(NamedTuple):
+    kind: str  # "picture" or "xml"
+    xml: Optional[bytes] = None
+    image_sha1: Optional[str] = None
+    position: Optional[Tuple[int, int, int, int]] = None  # left, top, width, height
+    # Relationships referenced by the shape XML, internal parts included
+    rels: Optional[Relationships] = None
+
+class SlideFragment(NamedTuple):
+    url: str
+    content_hash: str
+    slides: List[List[ShapeFragment]]
+    media: Dict[str, bytes]  # source image SHA1 -> ready-to-insert image blob
+
+def to_supported_image(blob: bytes, content_type: str) -> bytes:
+    if content_type in SUPPORTED_IMAGE_TYPES:
+        return blob
+    img = Image.open(BytesIO(blob))
+    logger.warning(f"Unsupported image format: {img.format}. Converting to PNG.")
+    output = BytesIO()
+    img.save(output, format="PNG")
+    return output.getvalue()
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _capture_part(part, media: Dict[str, bytes], visiting: frozenset) -> PartFragment:
+    if isinstance(part, ImagePart):
+        if part.sha1 not in media:
+            media[part.sha1] = to_supported_image(part.blob, part.content_type)
+        return PartFragment(str(part.partname), part.content_type, image_sha1=part.sha1)
+    visiting = visiting | {str(part.partname)}
+    return PartFragment(str(part.partname), part.content_type, blob=part.blob, rels=_capture_rels(part, None, media, visiting))
+
+def _capture_rels(part, rIds, media: Dict[str, bytes], visiting: frozenset) -> Relationships:
+    """Relationships of part (only rIds, when given), following internal targets recursively"""
+    rels = {}
+    for rId, rel in part.rels.items():
+        if rIds is not None and rId not in rIds:
+            continue
+        if rel.is_external:
+            rels[rId] = (rel.reltype, rel.target_ref, True)
+        elif str(rel.target_part.partname) not in visiting:
+            rels[rId] = (rel.reltype, _capture_part(rel.target_part, media, visiting), False)
+    return rels
+
+def extract_fragment(url: str, data: bytes) -> SlideFragment:
+    """
+    Parse a source deck once into shape XML, media blobs and the parts (charts, diagrams,
+    embeddings, grouped pictures) and external targets the shapes reference.
+    """
+    prs = Presentation(BytesIO(data))
+    media: Dict[str, bytes] = {}
+    slides = []
+    for source_slide in prs.slides:
+        shapes = []
+        for shape in source_slide.shapes:
+            position = (shape.left, shape.top, shape.width, shape.height)
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
+                image = shape.image
+                if image.sha1 not in media:
+                    media[image.sha1] = to_supported_image(image.blob, image.content_type)
+                shapes.append(ShapeFragment("picture", image_sha1=image.sha1, position=position))
+            else:
+                rIds = {
+                    value
+                    for element in shape.element.iter()
+                    for attr, value in element.attrib.items()
+                    if attr.startswith(R_NS)
+                }
+                shapes.append(ShapeFragment(
+                    "xml",
+                    xml=etree.tostring(shape.element),
+                    position=position,
+                    rels=_capture_rels(source_slide.part, rIds, media, frozenset({str(source_slide.part.partname)})),
+                ))
+        slides.append(shapes)
+    return SlideFragment(url, content_hash(data), slides, media)
+
+def _remap_rIds(element, remap: Dict[str, str]) -> None:
+    updates = [
+        (el, attr, remap[value])
+        for el in element.iter()
+        for attr, value in el.attrib.items()
+        if attr.startswith(R_NS) and value in remap
+    ]
+    for el, attr, rId in updates:
+        el.set(attr, rId)
+
+def _partname_template(partname: str) -> str:
+    # /ppt/charts/chart3.xml -> /ppt/charts/chart%d.xml
+    return re.sub(r"\d*(\.[^./]+)$", r"%d\1", partname)
+
+def _link(source_part, reltype: str, target, is_external: bool, fragment: SlideFragment, image_parts: dict, copied: dict) -> str:
+    """Relate source_part to an external URL or to a copy of a captured part; returns the new rId"""
+    if is_external:
+        return source_part.relate_to(target, reltype, is_external=True)
+    return source_part.relate_to(_copy_part(source_part.package, target, fragment, image_parts, copied), reltype)
+
+def _copy_part(package, part_fragment: PartFragment, fragment: SlideFragment, image_parts: dict, copied: dict):
+    if part_fragment.image_sha1 is not None:
+        image_part = image_parts.get(part_fragment.image_sha1)
+        if image_part is None:
+            image_part = package.get_or_add_image_part(BytesIO(fragment.media[part_fragment.image_sha1]))
+            image_parts[part_fragment.image_sha1] = image_part
+        return image_part
+
+    part = copied.get(part_fragment.partname)
+    if part is not None:
+        return part
+    part = Part.load(
+        partname=package.next_partname(_partname_template(part_fragment.partname)),
+        content_type=part_fragment.content_type,
+        package=package,
+        blob=part_fragment.blob,
+    )
+    copied[part_fragment.partname] = part
+    if part_fragment.rels:
+        remap = {
+            rId: _link(part, reltype, target, is_external, fragment, image_parts, copied)
+            for rId, (reltype, target, is_external) in part_fragment.rels.items()
+        }
+        element = etree.fromstring(part_fragment.blob)
+        _remap_rIds(element, remap)
+        part._blob = etree.tostring(element, xml_declaration=True, encoding="UTF-8", standalone=True)
+    return part
+
+def _splice_shape(slide, fragment: SlideFragment, shape: ShapeFragment, image_parts: dict, copied: dict) -> None:
+    if shape.kind == "picture":
+        image_part = image_parts.get(shape.image_sha1)
+        if image_part is None:
+            image_part, rId = slide.part.get_or_add_image_part(BytesIO(fragment.media[shape.image_sha1]))
+            image_parts[shape.image_sha1] = image_part
+        else:
+            rId = slide.part.relate_to(image_part, RT.IMAGE)
+        slide.shapes._add_pic_from_image_part(image_part, rId, *shape.position)
+        return
+
+    element = parse_xml(shape.xml)
+    if shape.rels:
+        _remap_rIds(element, {
+            rId: _link(slide.part, reltype, target, is_external, fragment, image_parts, copied)
+            for rId, (reltype, target, is_external) in shape.rels.items()
+        })
+    slide.shapes._spTree.insert_element_before(element, 'p:extLst')
+
+def assemble_deck(fragments: List[SlideFragment], output=None, strict: bool = False) -> Optional[bytes]:
+    """
+    Build the merged presentation by splicing pre-extracted fragments; runs in the pptx worker pool.
+    Writes to output when given, otherwise returns the package bytes. A shape that can't be
+    spliced is skipped, or raises IncompleteDeck when strict.
+    """
+    prs = Presentation()
+    prs.slide_width = Inches(13.33)  # Standard 16:9 aspect ratio
+    prs.slide_height = Inches(7.5)
+
+    image_parts = {}
+    for fragment in fragments:
+        for slide_shapes in fragment.slides:
+            slide = prs.slides.add_slide(prs.slide_layouts[6])
+            # Source partname -> copied part, so parts shared by shapes of a slide are copied once
+            copied = {}
+            for shape in slide_shapes:
+                try:
+                    _splice_shape(slide, fragment, shape, image_parts, copied)
+                except Exception as e:
+                    if strict:
+                        raise IncompleteDeck(f"Failed to splice shape from {fragment.url}: {str(e)}") from e
+                    logger.error(f"Failed to splice shape from {fragment.url}: {str(e)}")
+            slide.shapes._recalculate_extents()
+
+    if output is not None:
+        prs.save(output)
+        return None
+    buffer = BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+class SlideFragmentIndex:
+    """
+    Fragments keyed by slide URL and content hash, held in a small in-memory LRU and
+    persisted to SLIDE_FRAGMENT_DIR so they survive restarts. The disk tier is skipped
+    when that directory isn't private to this user.
+    """
+
+    def __init__(self, directory: str = SLIDE_FRAGMENT_DIR, max_entries: int = SLIDE_FRAGMENT_MEMORY_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, SlideFragment]" = OrderedDict()
+        self._disk_enabled: Optional[bool] = None
+
+    def _path(self, url: str, digest: str) -> str:
+        name = f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}-{digest}.v{FRAGMENT_FORMAT}.pkl"
+        return os.path.join(self.directory, name)
+
+    async def _disk_ready(self) -> bool:
+        if self._disk_enabled is None:
+            try:
+                await asyncio.to_thread(ensure_private_dir, self.directory)
+                self._disk_enabled = True
+            except OSError as e:
+                logger.error(f"Not persisting slide fragments: {str(e)}")
+                self._disk_enabled = False
+        return self._disk_enabled
+
+    def _remember(self, fragment: SlideFragment) -> None:
+        self._memory[fragment.url] = fragment
+        self._memory.move_to_end(fragment.url)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, url: str, data: bytes, extract) -> SlideFragment:
+        """
+        Return the fragment for this exact deck content, calling extract(url, data) when
+        neither tier has it.
+        """
+        digest = content_hash(data)
+        fragment = self._memory.get(url)
+        if fragment is not None and fragment.content_hash == digest:
+            memory_hits.inc()
+            self._memory.move_to_end(url)
+            return fragment
+
+        disk = await self._disk_ready()
+        path = self._path(url, digest)
+        try:
+            if not disk:
+                raise FileNotFoundError(path)
+            fragment = await asyncio.to_thread(_load, path)
+            disk_hits.inc()
+        except (OSError, pickle.UnpicklingError, EOFError):
+            fragment = await extract(url, data)
+            extractions.inc()
+            if disk:
+                try:
+                    await asyncio.to_thread(_dump, path, fragment)
+                except OSError as e:
+                    logger.error(f"Error persisting slide fragment for {url}: {str(e)}")
+
+        self._remember(fragment)
+        return fragment
+
+def _load(path: str) -> SlideFragment:
+    # Only reached once ensure_private_dir has vetted the directory; the file must be ours too
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_uid != os.getuid():
+            raise PermissionError(f"{path} is not owned by this user")
+        return pickle.load(f)
+
+def _dump(path: str, fragment: SlideFragment) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(fragment, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+fragment_index = SlideFragmentIndex()
@@ -0,0 +1,106 @@
+#worker_pool.py
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from app.core.logger import logger
+from app.core.metrics import counter, gauge, histogram
+
+PPTX_POOL_WORKERS = int(os.getenv("PPTX_POOL_WORKERS", "2"))
+PPTX_POOL_JOB_TIMEOUT = float(os.getenv("PPTX_POOL_JOB_TIMEOUT", "180"))
+# Replace a worker process after this many jobs to contain python-pptx memory growth
+PPTX_POOL_MAX_TASKS_PER_CHILD = int(os.getenv("PPTX_POOL_MAX_TASKS_PER_CHILD", "20"))
+# Seconds a recycled worker gets to exit after SIGTERM before it is killed
+PPTX_POOL_KILL_GRACE = float(os.getenv("PPTX_POOL_KILL_GRACE", "5"))
+
+JOB_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _terminate(processes: List[multiprocessing.Process], grace: float) -> None:
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + grace
+    for process in processes:
+        process.join(max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+class WorkerPool:
+    """
+    ProcessPoolExecutor wrapper for CPU-bound jobs with a per-job timeout, worker recycling
+    and queue-depth metrics. A timeout kills the pool's processes, so other jobs running at
+    that moment fail with BrokenProcessPool. With max_workers=0 jobs run in a thread instead,
+    where a timed-out job can't be stopped.
+    """
+
+    def __init__(self, name: str, max_workers: int, timeout: float, max_tasks_per_child: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.inflight = gauge(f"{name}_pool_jobs_inflight")
+        self.queue_depth = gauge(f"{name}_pool_queue_depth")
+        self.timeouts = counter(f"{name}_pool_timeouts_total")
+        self.failures = counter(f"{name}_pool_failures_total")
+        self.durations = histogram(f"{name}_pool_job_seconds", JOB_BUCKETS)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child or None,
+            )
+        return self._executor
+
+    def _recycle(self) -> None:
+        # Cancelling the asyncio future leaves the job running in its worker, so the old
+        # executor's processes are terminated; new jobs get fresh workers
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        asyncio.get_running_loop().run_in_executor(None, _terminate, processes, PPTX_POOL_KILL_GRACE)
+
+    def _update_depth(self) -> None:
+        self.queue_depth.set(max(0, self.inflight.value - max(1, self.max_workers)))
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        if self.max_workers > 0:
+            future = loop.run_in_executor(self._get_executor(), fn, *args)
+        else:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+
+        self.inflight.inc()
+        self._update_depth()
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts.inc()
+            logger.error(f"{self.name} job {fn.__name__} timed out after {timeout}s, recycling pool")
+            if self.max_workers > 0:
+                self._recycle()
+            raise
+        except Exception:
+            self.failures.inc()
+            raise
+        finally:
+            self.durations.observe(time.perf_counter() - start)
+            self.inflight.dec()
+            self._update_depth()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+pptx_pool = WorkerPool("pptx", PPTX_POOL_WORKERS, PPTX_POOL_JOB_TIMEOUT, PPTX_POOL_MAX_TASKS_PER_CHILD)
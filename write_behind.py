@@ -0,0 +1,326 @@
+#write_behind.py
+import asyncio
+import fcntl
+import glob
+import os
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+from uuid import UUID
+
+import asyncpg
+
+from app.core.logger import logger
+from app.core.metrics import counter, gauge, histogram
+from app.core.models import PendingMessage
+from app.core.utils.persist_helpers import add_messages
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+# Each process journals to its own slot file in this directory; point it at persistent storage
+WRITE_BEHIND_JOURNAL_DIR = os.getenv(
+    "WRITE_BEHIND_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), f"rfx-write-behind-{os.getuid()}")
+)
+# enqueue waits once this many messages are waiting for Postgres
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_MS", "200"))
+WRITE_BEHIND_RETRY_SECONDS = float(os.getenv("WRITE_BEHIND_RETRY_SECONDS", "2"))
+# A batch failing this many times for a non-connection reason is retried one message at a time,
+# and a message failing that often on its own is moved to the journal's dead_letter table
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+
+# Postgres being unreachable is retried indefinitely; anything else counts towards MAX_ATTEMPTS
+TRANSIENT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.InterfaceError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
+pending_messages = gauge("write_behind_pending_messages")
+oldest_age = gauge("write_behind_oldest_pending_seconds")
+lag_seconds = histogram("write_behind_lag_seconds")
+backpressure_waits = counter("write_behind_backpressure_waits_total")
+flushed_messages = counter("write_behind_flushed_messages_total")
+flush_failures = counter("write_behind_flush_failures_total")
+replayed_messages = counter("write_behind_replayed_messages_total")
+dead_lettered_messages = counter("write_behind_dead_lettered_messages_total")
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS dead_letter (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "payload TEXT NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+    )
+    return db
+
+def _try_lock(path: str) -> Optional[int]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+class MessageJournal:
+    """
+    Append-only SQLite journal of messages not yet confirmed in Postgres. Every process holds
+    an flock on its own slot (journal-<n>.sqlite3), so workers never replay or delete each
+    other's rows; journals of processes that are gone are adopted on open.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock_fd: Optional[int] = None
+
+    def _slot_path(self, slot: int) -> str:
+        return os.path.join(self.directory, f"journal-{slot}.sqlite3")
+
+    def open(self) -> List[Tuple[int, PendingMessage]]:
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        slot = 0
+        while (fd := _try_lock(f"{self._slot_path(slot)}.lock")) is None:
+            slot += 1
+        self._lock_fd, self.path = fd, self._slot_path(slot)
+        self._db = _connect(self.path)
+        self._adopt_orphans()
+        rows = self._db.execute("SELECT seq, payload FROM journal ORDER BY seq").fetchall()
+        return [(seq, PendingMessage.model_validate_json(payload)) for seq, payload in rows]
+
+    def _adopt_orphans(self) -> None:
+        # Slots left behind when the number of workers shrank are unlocked; take over their rows
+        for path in sorted(glob.glob(os.path.join(self.directory, "journal-*.sqlite3"))):
+            if path == self.path or (fd := _try_lock(f"{path}.lock")) is None:
+                continue
+            try:
+                orphan = _connect(path)
+                rows = orphan.execute("SELECT payload FROM journal ORDER BY seq").fetchall()
+                dead = orphan.execute("SELECT payload, error, failed_at FROM dead_letter ORDER BY id").fetchall()
+                orphan.close()
+                with self._db:
+                    self._db.execute("BEGIN")
+                    self._db.executemany("INSERT INTO journal (payload) VALUES (?)", rows)
+                    self._db.executemany("INSERT INTO dead_letter (payload, error, failed_at) VALUES (?, ?, ?)", dead)
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                if rows:
+                    logger.info(f"Adopted {len(rows)} journaled messages from {path}")
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def append(self, messages: List[PendingMessage]) -> List[int]:
+        seqs = []
+        with self._db:
+            self._db.execute("BEGIN")
+            for msg in messages:
+                cursor = self._db.execute("INSERT INTO journal (payload) VALUES (?)", (msg.model_dump_json(),))
+                seqs.append(cursor.lastrowid)
+        return seqs
+
+    def remove_through(self, seq: int) -> None:
+        self._db.execute("DELETE FROM journal WHERE seq <= ?", (seq,))
+
+    def dead_letter(self, seq: int, error: str) -> None:
+        """Move one message out of the journal, keeping it for inspection and manual replay"""
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO dead_letter (payload, error, failed_at) SELECT payload, ?, ? FROM journal WHERE seq = ?",
+                (error, time.time(), seq)
+            )
+            self._db.execute("DELETE FROM journal WHERE seq = ?", (seq,))
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+class WriteBehindQueue:
+    """
+    Journals messages locally and writes them to Postgres from a single background task.
+    One FIFO flusher keeps per-conversation ordering; unflushed journal entries are replayed
+    on start, and enqueue blocks when too many messages are waiting. Connection failures are
+    retried until Postgres is back; a message that keeps failing otherwise is dead-lettered
+    so it can't block the queue.
+    """
+
+    def __init__(
+        self,
+        journal_dir: str = WRITE_BEHIND_JOURNAL_DIR,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval_ms: float = WRITE_BEHIND_FLUSH_INTERVAL_MS
+    ):
+        self.journal = MessageJournal(journal_dir)
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        # (journal seq, enqueue time, message)
+        self._pending: Deque[Tuple[int, float, PendingMessage]] = deque()
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._journal_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        replay = await asyncio.to_thread(self.journal.open)
+        now = time.monotonic()
+        self._pending.extend((seq, now, msg) for seq, msg in replay)
+        if replay:
+            replayed_messages.inc(len(replay))
+            logger.info(f"Replaying {len(replay)} journaled messages")
+        self._update_gauges()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Flush what is pending within timeout; anything left stays in the journal for the next start"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping write-behind with {len(self._pending)} messages still journaled")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self.journal.close)
+
+    async def enqueue(self, messages: List[PendingMessage]) -> None:
+        if not messages:
+            return
+        async with self._changed:
+            if len(self._pending) + len(messages) > self.max_pending:
+                backpressure_waits.inc()
+                await self._changed.wait_for(lambda: len(self._pending) + len(messages) <= self.max_pending or not self._pending)
+        async with self._journal_lock:
+            seqs = await asyncio.to_thread(self.journal.append, messages)
+            now = time.monotonic()
+            self._pending.extend((seq, now, msg) for seq, msg in zip(seqs, messages))
+        self._update_gauges()
+        self._wakeup.set()
+
+    async def drain(self, conversation_id: Optional[UUID] = None) -> None:
+        """Wait until pending messages (optionally only those of one conversation) are in Postgres"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: not any(
+                conversation_id is None or msg.conversation_id == conversation_id
+                for _, _, msg in self._pending
+            ))
+
+    async def _run(self) -> None:
+        attempts = 0
+        # Messages left to flush one at a time after their batch kept failing
+        isolate = 0
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    continue
+            size = 1 if isolate else self.batch_size
+            try:
+                await self._flush_batch(size)
+                attempts = 0
+                isolate = max(0, isolate - 1)
+                continue
+            except asyncio.CancelledError:
+                raise
+            except TRANSIENT_ERRORS as e:
+                flush_failures.inc()
+                logger.error(f"Write-behind flush failed, retrying in {WRITE_BEHIND_RETRY_SECONDS}s: {str(e)}")
+            except Exception as e:
+                flush_failures.inc()
+                attempts += 1
+                if attempts >= WRITE_BEHIND_MAX_ATTEMPTS:
+                    attempts = 0
+                    if size == 1:
+                        await self._dead_letter_head(e)
+                        isolate = max(0, isolate - 1)
+                        continue
+                    isolate = min(self.batch_size, len(self._pending))
+                    logger.error(f"Write-behind batch failed {WRITE_BEHIND_MAX_ATTEMPTS} times, flushing it one message at a time: {str(e)}")
+                    continue
+                logger.error(f"Write-behind flush failed, retrying in {WRITE_BEHIND_RETRY_SECONDS}s: {str(e)}")
+            await asyncio.sleep(WRITE_BEHIND_RETRY_SECONDS)
+
+    async def _flush_batch(self, size: int) -> None:
+        batch = [self._pending[i] for i in range(min(size, len(self._pending)))]
+        # Replayed batches may already be partly in Postgres
+        await add_messages([msg for _, _, msg in batch], skip_existing=True)
+        async with self._journal_lock:
+            await asyncio.to_thread(self.journal.remove_through, batch[-1][0])
+
+        now = time.monotonic()
+        for _, enqueued_at, _ in batch:
+            self._pending.popleft()
+            lag_seconds.observe(now - enqueued_at)
+        flushed_messages.inc(len(batch))
+        await self._after_removal()
+
+    async def _dead_letter_head(self, error: Exception) -> None:
+        seq, _, msg = self._pending[0]
+        async with self._journal_lock:
+            await asyncio.to_thread(self.journal.dead_letter, seq, f"{type(error).__name__}: {error}")
+        self._pending.popleft()
+        dead_lettered_messages.inc()
+        logger.error(
+            f"Dropped message {msg.id} of conversation {msg.conversation_id} after {WRITE_BEHIND_MAX_ATTEMPTS} "
+            f"failed writes, kept in {self.journal.path} (dead_letter): {str(error)}"
+        )
+        await self._after_removal()
+
+    async def _after_removal(self) -> None:
+        self._update_gauges()
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _update_gauges(self) -> None:
+        pending_messages.set(len(self._pending))
+        oldest_age.set(time.monotonic() - self._pending[0][1] if self._pending else 0)
+
+write_behind_queue = WriteBehindQueue()
+
+# Called from the app lifespan next to create_pool/close_pool
+async def start_write_behind() -> None:
+    if WRITE_BEHIND_ENABLED:
+        await write_behind_queue.start()
+
+async def stop_write_behind() -> None:
+    await write_behind_queue.stop()
+
+async def persist_messages(messages: List[PendingMessage]) -> None:
+    """Save messages through the write-behind queue when it is running, otherwise directly"""
+    if write_behind_queue.running:
+        await write_behind_queue.enqueue(messages)
+    else:
+        # Replays of the same message ids (e.g. a resumed job) are ignored, as when flushing
+        await add_messages(messages, skip_existing=True)
+
+async def flush_conversation(conversation_id: UUID) -> None:
+    """Make a conversation's queued messages visible in Postgres before reading it back"""
+    if write_behind_queue.running:
+        await write_behind_queue.drain(conversation_id)